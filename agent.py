@@ -1,28 +1,87 @@
-from typing import Annotated, List, Optional, Dict
+from typing import Annotated, Iterable, List, Optional, Dict
 from typing_extensions import TypedDict
 from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
 from langchain_core.tools import StructuredTool
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END, START
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, wait
 from pydantic import BaseModel, Field
 from langsmith import traceable
-from langsmith.wrappers import wrap_openai
-from openai import OpenAI
+from openai import RateLimitError
+from collections import deque
+from itertools import takewhile
+import asyncio
+import functools
 import json
 import os
+import time
 from dotenv import load_dotenv
-from tools import linkedin_tool, hunter_tool, LinkedInProfileResponse
-from prompts import LINKEDIN_ANALYSIS_PROMPT, PRIORITY_ANALYSIS_PROMPT
+from tools import linkedin_tool, hunter_tool, LinkedInProfileResponse, prefetch_linkedin_profile, aprefetch_linkedin_profile
+from prompts import LINKEDIN_ANALYSIS_PROMPT, LINKEDIN_BATCH_ANALYSIS_PROMPT, PRIORITY_ANALYSIS_PROMPT
+from cache import StaleWhileRevalidateCache, SQLiteTTLCache, content_key
+from tokens import estimate_tokens
+from ranking import prerank_users, PrerankIndex
+from condense import condense_profile, LINKEDIN_PROFILE_TOKENS
+from features import extract_features, FEATURE_FIELDS
+from snapshots import (
+    INCREMENTAL_PROSPECTING, ContactDiff, diff_contacts, is_changed, load_snapshot, previous_user, save_snapshot
+)
+from limits import provider_slot, aprovider_slot, provider_busy, rate_limiter, RATE_LIMIT_MAX_RETRIES
+from reducers import add_messages, add_users, tag_run
+from metrics import track_node, track_llm, record_llm_usage, record_tokens_saved
+from llm_clients import structured_model
 
 load_dotenv()
 
 # Configs
 DEFAULT_MODEL = "gpt-4o-mini"  # eller "gpt-3.5-turbo" basert på behov
 DEFAULT_TEMPERATURE = 0
+LINKEDIN_CONCURRENCY = int(os.getenv("LINKEDIN_CONCURRENCY", "5"))  # Maks samtidige LinkedIn-berikelser
+HUNTER_PAGE_SIZE = 50
+HUNTER_CONCURRENCY = int(os.getenv("HUNTER_CONCURRENCY", "4"))  # Maks samtidige Hunter-sider
+HUNTER_PAGE_RETRIES = int(os.getenv("HUNTER_PAGE_RETRIES", "1"))  # Nye forsøk per feilet side (utover HTTP-retry)
+HUNTER_RETRY_BACKOFF = 0.5  # Sekunder, dobles for hvert nytt forsøk
+HUNTER_CACHE_TTL = float(os.getenv("HUNTER_CACHE_TTL", "600"))  # Sekunder kontaktlisten regnes som fersk, 0 skrur av
+HUNTER_CACHE_STALE_TTL = float(os.getenv("HUNTER_CACHE_STALE_TTL", "3600"))  # Sekunder en gammel liste kan serveres mens den fornyes
+PRIORITY_CHUNK_TOKENS = int(os.getenv("PRIORITY_CHUNK_TOKENS", "6000"))  # Token-budsjett for brukerlisten per prioriteringskall
+PRIORITY_CONCURRENCY = int(os.getenv("PRIORITY_CONCURRENCY", "4"))  # Maks samtidige prioriteringskall
+PRERANK_TOP_N = int(os.getenv("PRERANK_TOP_N", "100"))  # Kandidater som sendes til LLM etter lokal rangering, 0 skrur av
+LINKEDIN_BATCH_SIZE = int(os.getenv("LINKEDIN_BATCH_SIZE", "1"))  # Profiler per LinkedIn-analysekall, 1 = én per bruker
+LINKEDIN_PREFETCH_BUDGET = int(os.getenv("LINKEDIN_PREFETCH_BUDGET", "0"))  # Profiler som hentes spekulativt mens prioriteringen pågår, 0 skrur av
+LINKEDIN_PREFETCH_CONCURRENCY = int(os.getenv("LINKEDIN_PREFETCH_CONCURRENCY", str(LINKEDIN_CONCURRENCY)))  # Samtidige spekulative hentinger per søk
+PIPELINED_MODE = os.getenv("PIPELINED_MODE", "false").lower() == "true"  # Overlapp Hunter-innsamling, prioritering og LinkedIn-henting
+PIPELINE_CHUNK_TOKENS = int(os.getenv("PIPELINE_CHUNK_TOKENS", "3000"))  # Mindre prioriteringsdeler, så de kan starte mens sidene kommer inn
+PIPELINE_STRONG_FRACTION = float(os.getenv("PIPELINE_STRONG_FRACTION", "0.8"))  # Sterk kandidat: minst denne andelen av beste forhåndsscore så langt
+PIPELINE_CANDIDATE_FACTOR = int(os.getenv("PIPELINE_CANDIDATE_FACTOR", "4"))  # Stopp pagineringen ved max_results * faktor sterke kandidater
+PIPELINE_CONFIRM_SCORE = float(os.getenv("PIPELINE_CONFIRM_SCORE", "0.9"))  # LLM-score som starter LinkedIn-henting før utvalget er ferdig
+
+# Kontaktlister per domene, delt mellom forespørsler i prosessen
+hunter_cache = StaleWhileRevalidateCache(
+    ttl=HUNTER_CACHE_TTL,
+    stale_ttl=HUNTER_CACHE_STALE_TTL,
+    max_entries=int(os.getenv("HUNTER_CACHE_MAX_DOMAINS", "200")),
+    name="hunter_contacts"
+)
 
-# Wrap OpenAI client for better tracing
-openai_client = wrap_openai(OpenAI())
+# Cache for strukturerte LLM-analyser (deterministiske ved temperature 0)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+llm_cache = SQLiteTTLCache(
+    namespace="llm_analysis",
+    ttl=float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600))),
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+)
+
+# Checkpointing til lokal SQLite er valgfritt og skrus på med CHECKPOINT_DB_PATH.
+# Fremdrift per beriket bruker lagres i tillegg, slik at en avbrutt
+# get_linkedin_info fortsetter fra siste ferdige bruker.
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH")
+enrichment_progress = SQLiteTTLCache(
+    namespace="enrichment_progress",
+    ttl=float(os.getenv("CHECKPOINT_PROGRESS_TTL", str(7 * 24 * 3600))),
+    max_entries=100000,
+    path=CHECKPOINT_DB_PATH
+)
 
 # User model with enrichment fields -> # Brukermodell med berikelsesfelter
 class User(TypedDict, total=False):  # Legg til total=False for å gjøre alle felter valgfrie
@@ -36,6 +95,8 @@ class User(TypedDict, total=False):  # Legg til total=False for å gjøre alle f
     # Hunter.io data -> # Hunter.io data
     linkedin_url: Optional[str]
     phone_number: Optional[str]
+    department: Optional[str]
+    seniority: Optional[str]
     
     # LinkedIn enrichment -> # LinkedIn-berikelse
     summary: Optional[str]
@@ -57,6 +118,8 @@ class User(TypedDict, total=False):  # Legg til total=False for å gjøre alle f
     priority_reason: Optional[str]
     screening_score: Optional[float]
     screening_reason: Optional[str]
+    prerank_score: Optional[float]
+    prerank_similarity: Optional[float]
 
 # Search config -> # Søkekonfigurasjon
 class SearchConfig(TypedDict):
@@ -64,26 +127,33 @@ class SearchConfig(TypedDict):
     target_role: str
     search_depth: int
     max_results: Optional[int] = 5  # Ny parameter med default verdi
-
-# Først definerer vi reducers
-def add_messages(old_messages: List[BaseMessage], new_messages: List[BaseMessage]) -> List[BaseMessage]:
-    return old_messages + new_messages
-
-def add_users(old_users: List[User], new_users: List[User]) -> List[User]:
-    """Reducer som oppdaterer eller legger til brukere basert på email."""
-    email_to_user = {user['email']: user for user in old_users}
-    for new_user in new_users:
-        if new_user['email'] in email_to_user:
-            email_to_user[new_user['email']].update(new_user)
-        else:
-            email_to_user[new_user['email']] = new_user
-    return list(email_to_user.values())
+    linkedin_concurrency: Optional[int]  # Overstyrer LINKEDIN_CONCURRENCY per søk
+    bypass_llm_cache: Optional[bool]  # Hopp over LLM-cachen for dette søket
+    priority_chunk_tokens: Optional[int]  # Overstyrer PRIORITY_CHUNK_TOKENS per søk
+    priority_rerank: Optional[bool]  # Rangér finalistene på nytt etter oppdelt prioritering
+    prerank_top_n: Optional[int]  # Overstyrer PRERANK_TOP_N per søk
+    hunter_concurrency: Optional[int]  # Overstyrer HUNTER_CONCURRENCY per søk
+    linkedin_profile_tokens: Optional[int]  # Overstyrer LINKEDIN_PROFILE_TOKENS per søk
+    linkedin_batch_size: Optional[int]  # Overstyrer LINKEDIN_BATCH_SIZE per søk
+    incremental: Optional[bool]  # Overstyrer INCREMENTAL_PROSPECTING per søk
+    linkedin_prefetch_budget: Optional[int]  # Overstyrer LINKEDIN_PREFETCH_BUDGET per søk
+    pipelined: Optional[bool]  # Overstyrer PIPELINED_MODE per søk
+    pipeline_chunk_tokens: Optional[int]  # Overstyrer PIPELINE_CHUNK_TOKENS per søk
 
 # Så definerer vi state
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]
     config: SearchConfig
-    users: Annotated[List[User], add_users]
+    users: Annotated[Dict[str, User], add_users]  # email -> bruker
+
+def emit_event(config: RunnableConfig, event: dict) -> None:
+    """Sender en fremdriftshendelse til lytteren i config["configurable"]["event_sink"], hvis satt.
+    
+    Brukes av strømme-endepunktet for å levere resultater før grafen er ferdig.
+    """
+    sink = (config or {}).get("configurable", {}).get("event_sink")
+    if sink:
+        sink(event)
 
 # 3. SCREENING NODE (FØRSTE STEG)
 class HunterDataCollector:
@@ -96,66 +166,325 @@ class HunterDataCollector:
     )
     def run(self, state: AgentState, config: RunnableConfig) -> AgentState:
         """Henter alle kontakter fra Hunter.io"""
+        domain = state["config"]["domain"]
+        fan_out = max(1, state["config"].get("hunter_concurrency") or HUNTER_CONCURRENCY)
+        
+        cached = self._from_cache(domain, fan_out)
+        if cached:
+            return cached
+        
+        messages, users, complete = self._collect(domain, fan_out, config)
+        self._store(domain, users, complete)
+        
+        return {
+            "messages": messages,
+            "users": users
+        }
+    
+    @traceable(
+        run_type="chain",
+        name="hunter_collection",
+        metadata={"type": "data_collection"}
+    )
+    async def arun(self, state: AgentState, config: RunnableConfig) -> AgentState:
+        """Async variant av run()"""
+        domain = state["config"]["domain"]
+        fan_out = max(1, state["config"].get("hunter_concurrency") or HUNTER_CONCURRENCY)
+        
+        cached = self._from_cache(domain, fan_out, asyncio.get_running_loop())
+        if cached:
+            return cached
+        
+        messages, users, complete = await self._acollect(domain, fan_out, config)
+        self._store(domain, users, complete)
+        
+        return {
+            "messages": messages,
+            "users": users
+        }
+    
+    def _from_cache(
+        self, domain: str, fan_out: int, loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> Optional[AgentState]:
+        """Domenecache: server cachet liste umiddelbart, forny i bakgrunnen hvis den er gammel.
+        
+        Fra async-stien (loop satt) kjøres fornyelsen på den samme event loopen,
+        slik at Hunter-kallene teller mot loopens leverandørgrense i stedet for å
+        komme i tillegg via trådgrensen.
+        """
+        if HUNTER_CACHE_TTL <= 0:
+            return None
+        cache_key = domain.strip().lower()
+        cached_users, status = hunter_cache.get(cache_key)
+        if status == "miss":
+            return None
+        if status == "stale":
+            if loop is None:
+                hunter_cache.refresh(cache_key, lambda: self._collect_complete(domain, fan_out))
+            else:
+                hunter_cache.refresh(cache_key, lambda: asyncio.run_coroutine_threadsafe(
+                    self._acollect_complete(domain, fan_out), loop
+                ).result())
+        return {
+            "messages": [
+                ToolMessage(
+                    tool_call_id="hunter_cache",
+                    tool_name="hunter_collection",
+                    content=f"Hentet {len(cached_users)} kontakter fra cache ({status})"
+                )
+            ],
+            "users": [{**user, "sources": list(user["sources"])} for user in cached_users]
+        }
+    
+    def _store(self, domain: str, users: List[User], complete: bool) -> None:
+        if HUNTER_CACHE_TTL > 0 and complete and users:
+            hunter_cache.set(domain.strip().lower(), users)
+    
+    def _collect_complete(self, domain: str, fan_out: int) -> Optional[List[User]]:
+        """Henter hele kontaktlisten, eller None hvis noen sider feilet"""
+        _, users, complete = self._collect(domain, fan_out)
+        return users if complete and users else None
+    
+    async def _acollect_complete(self, domain: str, fan_out: int) -> Optional[List[User]]:
+        """Async variant av _collect_complete()"""
+        _, users, complete = await self._acollect(domain, fan_out)
+        return users if complete and users else None
+    
+    def _collect(self, domain: str, fan_out: int, config: Optional[RunnableConfig] = None):
+        """Henter alle sider for domenet. Returnerer (meldinger, brukere, komplett)."""
+        limit = HUNTER_PAGE_SIZE
+        
+        def fetch(offset: int):
+            result = self._fetch_page(domain, offset, limit)
+            self._emit_progress(config, offset, result)
+            return result
+        
+        # Første side gir totalt antall kontakter
+        first_page, error = fetch(0)
+        if error:
+            return [self._error_message(0, error)], [], False
+        if not first_page["emails"]:
+            return [], [], True
+        
+        pages = {0: (first_page, None)}
+        
+        # Resten av sidene hentes parallelt med begrenset fan-out
+        offsets = list(range(limit, first_page["meta"]["total"], limit))
+        if offsets:
+            with ContextThreadPoolExecutor(max_workers=min(fan_out, len(offsets))) as executor:
+                for offset, result in zip(offsets, executor.map(fetch, offsets)):
+                    pages[offset] = result
+        
+        return self._merge_pages(pages)
+    
+    async def _acollect(self, domain: str, fan_out: int, config: Optional[RunnableConfig] = None):
+        """Async variant av _collect()"""
+        limit = HUNTER_PAGE_SIZE
+        semaphore = asyncio.Semaphore(fan_out)
+        
+        async def fetch(offset: int):
+            async with semaphore:
+                result = await self._afetch_page(domain, offset, limit)
+            self._emit_progress(config, offset, result)
+            return result
+        
+        first_page, error = await fetch(0)
+        if error:
+            return [self._error_message(0, error)], [], False
+        if not first_page["emails"]:
+            return [], [], True
+        
+        pages = {0: (first_page, None)}
+        
+        offsets = list(range(limit, first_page["meta"]["total"], limit))
+        
+        for offset, result in zip(offsets, await asyncio.gather(*(fetch(o) for o in offsets))):
+            pages[offset] = result
+        
+        return self._merge_pages(pages)
+    
+    def _merge_pages(self, pages: Dict[int, tuple]):
+        """Slår sammen sidene i offset-rekkefølge"""
         messages = []
         users = []
-        offset = 0
-        limit = 50
+        complete = True
+        for offset in sorted(pages):
+            hunter_data, error = pages[offset]
+            if error:
+                messages.append(self._error_message(offset, error))
+                complete = False
+                continue
+            
+            users.extend(self._to_user(email) for email in hunter_data["emails"])
+            messages.append(
+                ToolMessage(
+                    tool_call_id=f"hunter_batch_{offset}",
+                    tool_name="hunter_collection",
+                    content=f"Hentet {len(hunter_data['emails'])} kontakter"
+                )
+            )
         
-        while True:
+        return messages, users, complete
+    
+    @staticmethod
+    def _emit_progress(config: Optional[RunnableConfig], offset: int, result: tuple) -> None:
+        hunter_data, error = result
+        emit_event(config, {
+            "type": "hunter_progress",
+            "offset": offset,
+            "contacts": len(hunter_data["emails"]) if hunter_data else 0,
+            "total": hunter_data["meta"]["total"] if hunter_data else None,
+            "error": str(error) if error else None
+        })
+    
+    @staticmethod
+    def _page_request(domain: str, offset: int, limit: int) -> dict:
+        return {
+            "domain": domain,
+            "api_key": os.getenv("HUNTER_API_KEY"),
+            "offset": offset,
+            "limit": limit
+        }
+    
+    def _fetch_page(self, domain: str, offset: int, limit: int):
+        """Henter én side fra Hunter.io med retry. Returnerer (data, feil)."""
+        error = None
+        for attempt in range(HUNTER_PAGE_RETRIES + 1):
             try:
-                # Hent batch med kontakter
-                hunter_data = hunter_tool.invoke({
-                    "domain": state["config"]["domain"],
-                    "api_key": os.getenv("HUNTER_API_KEY"),
-                    "offset": offset,
-                    "limit": limit
-                })
-                
-                if not hunter_data["emails"]:
-                    break
-                
-                # Konverter direkte til User objekter
-                for email in hunter_data["emails"]:
-                    users.append({
-                        "email": email["value"],
-                        "first_name": email.get("first_name", ""),
-                        "last_name": email.get("last_name", ""),
-                        "role": email.get("position", ""),
-                        "confidence": str(email.get("confidence", "")),
-                        "linkedin_url": email.get("linkedin", ""),
-                        "phone_number": email.get("phone_number", ""),
-                        "sources": ["hunter"],
-                        "department": email.get("department", ""),
-                        "seniority": email.get("seniority", "")
-                    })
-                
-                messages.append(
-                    ToolMessage(
-                        tool_call_id=f"hunter_batch_{offset}",
-                        tool_name="hunter_collection",
-                        content=f"Hentet {len(hunter_data['emails'])} kontakter"
-                    )
-                )
-                
-                # Gå til neste side
-                offset += limit
-                if offset >= hunter_data["meta"]["total"]:
-                    break
-                    
+                return hunter_tool.invoke(self._page_request(domain, offset, limit)), None
             except Exception as e:
-                messages.append(
-                    ToolMessage(
-                        tool_call_id="hunter_error",
-                        tool_name="hunter_collection",
-                        content=f"Feil under henting av kontakter: {str(e)}"
-                    )
-                )
-                break
+                error = e
+                if attempt < HUNTER_PAGE_RETRIES:
+                    time.sleep(HUNTER_RETRY_BACKOFF * (2 ** attempt))
+        return None, error
+    
+    async def _afetch_page(self, domain: str, offset: int, limit: int):
+        """Async variant av _fetch_page()"""
+        error = None
+        for attempt in range(HUNTER_PAGE_RETRIES + 1):
+            try:
+                return await hunter_tool.ainvoke(self._page_request(domain, offset, limit)), None
+            except Exception as e:
+                error = e
+                if attempt < HUNTER_PAGE_RETRIES:
+                    await asyncio.sleep(HUNTER_RETRY_BACKOFF * (2 ** attempt))
+        return None, error
+    
+    @staticmethod
+    def _to_user(email: dict) -> User:
+        """Konverterer en Hunter-e-post direkte til et User objekt.
         
+        Hunter sender null for felter den ikke kjenner; de blir tomme strenger.
+        """
         return {
-            "messages": messages,
-            "users": users
+            "email": email["value"],
+            "first_name": email.get("first_name") or "",
+            "last_name": email.get("last_name") or "",
+            "role": email.get("position") or "",
+            "confidence": str(email.get("confidence", "")),
+            "linkedin_url": email.get("linkedin") or "",
+            "phone_number": email.get("phone_number") or "",
+            "sources": ["hunter"],
+            "department": email.get("department") or "",
+            "seniority": email.get("seniority") or ""
         }
+    
+    @staticmethod
+    def _error_message(offset: int, error: Exception) -> ToolMessage:
+        return ToolMessage(
+            tool_call_id=f"hunter_error_{offset}",
+            tool_name="hunter_collection",
+            content=f"Feil under henting av kontakter (offset {offset}): {str(error)}"
+        )
+
+def _structured_model(schema: type):
+    """LLM med strukturert output, hentet fra det delte registeret"""
+    return structured_model(schema, DEFAULT_MODEL, DEFAULT_TEMPERATURE)
+
+def _llm_cache_key(schema: type, template: str, prompt_args: dict, state: AgentState) -> Optional[str]:
+    """Cache-nøkkel for et strukturert LLM-kall, eller None når cachen er av.
+    
+    Nøkkelen dekker modell, metode, skjema, promptmal og alle promptargumenter
+    (målrolle og serialisert input).
+    """
+    if not LLM_CACHE_ENABLED or state["config"].get("bypass_llm_cache"):
+        return None
+    return content_key(
+        DEFAULT_MODEL,
+        DEFAULT_TEMPERATURE,
+        "json_mode",
+        schema.model_json_schema(),
+        template,
+        prompt_args
+    )
+
+def invoke_structured(model, schema: type, template: str, prompt_args: dict, state: AgentState, config: RunnableConfig):
+    """Kaller LLM med strukturert output, med innholdsadressert cache foran.
+    
+    Cachen lagrer den validerte outputen og validerer den på nytt ved treff,
+    slik at json_mode gir samme form begge veier.
+    """
+    key = _llm_cache_key(schema, template, prompt_args, state)
+    if key:
+        entry = llm_cache.get(key)
+        if entry is not None:
+            return schema.model_validate(entry.value)
+    
+    prompt = template.format(**prompt_args)
+    with provider_slot("openai"):
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            rate_limiter.acquire("openai", os.getenv("OPENAI_API_KEY"))
+            try:
+                with track_llm(schema.__name__):
+                    output = model.invoke(prompt, config=config)
+                break
+            except RateLimitError as e:
+                _observe_rate_limit(e, attempt)
+        result = _parsed(schema, output)
+    
+    if key:
+        llm_cache.set(key, result.model_dump())
+    return result
+
+def _observe_rate_limit(error: RateLimitError, attempt: int) -> None:
+    """429 fra OpenAI (etter SDK-ens egne forsøk): senk raten, eller gi opp etter siste forsøk"""
+    rate_limiter.observe("openai", os.getenv("OPENAI_API_KEY"), 429, error.response.headers)
+    if attempt >= RATE_LIMIT_MAX_RETRIES:
+        raise error
+
+def _parsed(schema: type, output: dict):
+    """Henter validert output fra include_raw-svaret og teller tokens per prompt"""
+    raw = output["raw"]
+    rate_limiter.observe("openai", os.getenv("OPENAI_API_KEY"), 200, raw.response_metadata.get("headers"))
+    record_llm_usage(schema.__name__, getattr(raw, "usage_metadata", None))
+    if output["parsing_error"] is not None:
+        raise output["parsing_error"]
+    return output["parsed"]
+
+async def ainvoke_structured(model, schema: type, template: str, prompt_args: dict, state: AgentState, config: RunnableConfig):
+    """Async variant av invoke_structured(). Cachen er SQLite og brukes fra en
+    tråd, slik at event loopen ikke venter på disken."""
+    key = _llm_cache_key(schema, template, prompt_args, state)
+    if key:
+        entry = await asyncio.to_thread(llm_cache.get, key)
+        if entry is not None:
+            return schema.model_validate(entry.value)
+    
+    prompt = template.format(**prompt_args)
+    async with aprovider_slot("openai"):
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            await rate_limiter.aacquire("openai", os.getenv("OPENAI_API_KEY"))
+            try:
+                with track_llm(schema.__name__):
+                    output = await model.ainvoke(prompt, config=config)
+                break
+            except RateLimitError as e:
+                _observe_rate_limit(e, attempt)
+        result = _parsed(schema, output)
+    
+    if key:
+        await asyncio.to_thread(llm_cache.set, key, result.model_dump())
+    return result
 
 # 4. PRIORITERING NODE (ANDRE STEG)
 class PriorityAnalysis(BaseModel):
@@ -170,47 +499,314 @@ class PriorityAnalysis(BaseModel):
 def prioritize_users(state: AgentState, config: RunnableConfig) -> AgentState:
     """Prioriterer brukere basert på deres egnethet for målrollen."""
     
-    # Setup LLM med strukturert output
-    model = ChatOpenAI(
-        model=DEFAULT_MODEL,
-        temperature=DEFAULT_TEMPERATURE,
-        api_key=os.getenv("OPENAI_API_KEY")  # Bruk API-nøkkel direkte
-    ).with_structured_output(
-        PriorityAnalysis,
-        method="json_mode"
+    model = _structured_model(PriorityAnalysis)
+    
+    users_to_analyze, candidates, messages, carried = _prioritization_input(state)
+    if not users_to_analyze and not carried:
+        return {
+            "messages": messages + [HumanMessage(content="Ingen brukere med roller funnet")],
+            "users": []
+        }
+    
+    # Hent de mest sannsynlige profilene mens LLM-en jobber
+    prefetch = SpeculativePrefetch.start(users_to_analyze, state, messages)
+    
+    def analyze(batch: List[dict]) -> Dict[str, dict]:
+        return invoke_structured(
+            model, PriorityAnalysis, PRIORITY_ANALYSIS_PROMPT, _priority_args(state, batch), state, config
+        ).users
+    
+    chunks = _chunk_by_tokens(
+        candidates,
+        state["config"].get("priority_chunk_tokens") or PRIORITY_CHUNK_TOKENS
     )
     
-    # Filtrer brukere med rolle
-    users_to_analyze = [u for u in state["users"] if u.get("role")]
+    selected = {}
+    if len(chunks) == 1:
+        # Analyser alle brukere i én forespørsel
+        selected = analyze(candidates)
+    elif chunks:
+        # Map: score hver del parallelt. Reduce: globalt topp max_results.
+        outcomes = []
+        with ContextThreadPoolExecutor(max_workers=min(PRIORITY_CONCURRENCY, len(chunks))) as executor:
+            for future in [executor.submit(analyze, chunk) for chunk in chunks]:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+        selected = _reduce_chunks(outcomes, state, messages)
+        
+        # Valgfri sluttrangering av finalistene i én felles forespørsel
+        if state["config"].get("priority_rerank") and selected:
+            selected = analyze([c for c in candidates if c["email"] in selected])
+    
+    return prefetch.finish(_apply_priorities(users_to_analyze, selected, messages, carried, state))
+
+@traceable(
+    run_type="chain",
+    name="prioritize_users",
+    metadata={"type": "prioritization"}
+)
+async def aprioritize_users(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async variant av prioritize_users()"""
+    
+    model = _structured_model(PriorityAnalysis)
     
-    if not users_to_analyze:
+    # Øyeblikksbildet (SQLite) og forhåndsrangeringen kjøres i en tråd
+    users_to_analyze, candidates, messages, carried = await asyncio.to_thread(_prioritization_input, state)
+    if not users_to_analyze and not carried:
         return {
-            "messages": [HumanMessage(content="Ingen brukere med roller funnet")],
+            "messages": messages + [HumanMessage(content="Ingen brukere med roller funnet")],
             "users": []
         }
     
-    # Analyser alle brukere i én forespørsel
-    analysis = model.invoke(
-        PRIORITY_ANALYSIS_PROMPT.format(
-            role=state['config']['target_role'],
-            max_results=state['config'].get('max_results', 5),
-            users=json.dumps([{
-                "name": f"{u['first_name']} {u['last_name']}",
-                "role": u['role'],
-                "email": u['email'],
-                "linkedin_url": u.get('linkedin_url', ''),  # Legg til LinkedIn URL
-                "confidence": u.get('confidence', ''),      # Legg til confidence score
-                "department": u.get('department', ''),      # Legg til avdeling
-                "seniority": u.get('seniority', '')        # Legg til ansiennitet
-            } for u in users_to_analyze], indent=2)
-        ),
-        config=config
+    prefetch = SpeculativePrefetch.astart(users_to_analyze, state, messages)
+    
+    semaphore = asyncio.Semaphore(PRIORITY_CONCURRENCY)
+    
+    async def analyze(batch: List[dict]) -> Dict[str, dict]:
+        async with semaphore:
+            return (await ainvoke_structured(
+                model, PriorityAnalysis, PRIORITY_ANALYSIS_PROMPT, _priority_args(state, batch), state, config
+            )).users
+    
+    chunks = _chunk_by_tokens(
+        candidates,
+        state["config"].get("priority_chunk_tokens") or PRIORITY_CHUNK_TOKENS
     )
     
-    # Oppdater brukere med prioriteringer
+    selected = {}
+    if len(chunks) == 1:
+        selected = await analyze(candidates)
+    elif chunks:
+        outcomes = await asyncio.gather(*(analyze(chunk) for chunk in chunks), return_exceptions=True)
+        selected = _reduce_chunks(outcomes, state, messages)
+        
+        if state["config"].get("priority_rerank") and selected:
+            selected = await analyze([c for c in candidates if c["email"] in selected])
+    
+    return prefetch.finish(_apply_priorities(users_to_analyze, selected, messages, carried, state))
+
+def _prioritization_input(state: AgentState):
+    """Velger kandidater for prioritering.
+    
+    Returnerer (brukere, LLM-payload, meldinger, videreførte prioriteringer).
+    Inkrementelt sendes bare nye og endrede kontakter til LLM, og forrige
+    kjørings utvalg blant de uendrede føres videre med sin score.
+    """
+    # Filtrer brukere med rolle
+    users_to_analyze = [u for u in state["users"].values() if u.get("role")]
+    messages = []
+    carried = {}
+    
+    snapshot = _previous_snapshot(state)
+    if snapshot:
+        diff = diff_contacts(snapshot, state["users"].values())
+        messages.append(HumanMessage(content=f"Inkrementelt søk: {diff.describe()}"))
+        carried = _carried_priorities(snapshot, diff, state)
+        if carried is None:
+            carried = {}
+            messages.append(HumanMessage(content="Forrige utvalg kan ikke gjenbrukes, prioriterer alle på nytt"))
+        else:
+            users_to_analyze = [u for u in users_to_analyze if u["email"] in diff.delta]
+            messages.append(HumanMessage(content=f"Gjenbrukte prioritering for {len(carried)} uendrede kontakter"))
+    
+    # Lokal forhåndsrangering: bare de N beste kandidatene går videre til LLM
+    top_n = state["config"].get("prerank_top_n", PRERANK_TOP_N)
+    if top_n and users_to_analyze:
+        ranked = prerank_users(users_to_analyze, state["config"]["target_role"])
+        users_to_analyze = ranked[:top_n]
+        if len(ranked) > top_n:
+            messages.append(HumanMessage(content=f"Forhåndsrangerte {len(ranked)} brukere lokalt, sender {top_n} til analyse"))
+    
+    candidates = [_candidate(u) for u in users_to_analyze]
+    
+    return users_to_analyze, candidates, messages, carried
+
+def _candidate(u: User) -> dict:
+    """Det LLM-en får se av en kontakt under prioriteringen"""
+    return {
+        "name": f"{u.get('first_name', '')} {u.get('last_name', '')}".strip(),
+        "role": u.get('role', ''),
+        "email": u['email'],
+        "linkedin_url": u.get('linkedin_url', ''),  # Legg til LinkedIn URL
+        "confidence": u.get('confidence', ''),      # Legg til confidence score
+        "department": u.get('department', ''),      # Legg til avdeling
+        "seniority": u.get('seniority', '')        # Legg til ansiennitet
+    }
+
+def _incremental(state: AgentState) -> bool:
+    incremental = state["config"].get("incremental")
+    return INCREMENTAL_PROSPECTING if incremental is None else bool(incremental)
+
+def _previous_snapshot(state: AgentState) -> Optional[dict]:
+    """Forrige resultat for domenet og rollen, når inkrementelt søk er på.
+    
+    bypass_llm_cache betyr at LLM skal spørres på nytt, så da brukes ikke bildet.
+    """
+    if not _incremental(state) or state["config"].get("bypass_llm_cache"):
+        return None
+    return load_snapshot(state["config"]["domain"], state["config"]["target_role"])
+
+def _carried_priorities(snapshot: dict, diff: ContactDiff, state: AgentState) -> Optional[Dict[str, dict]]:
+    """Forrige utvalg (email -> score og begrunnelse), eller None når alle må prioriteres på nytt.
+    
+    Uendrede kontakter utenfor forrige utvalg ble rangert lavere enn hele
+    utvalget. Er en fra utvalget borte eller endret, er det ukjent hvem av dem
+    som skal fylle plassen, og da prioriteres alle. Det samme gjelder når
+    max_results er endret.
+    """
+    if snapshot.get("max_results") != state["config"].get("max_results", 5):
+        return None
+    unchanged = {email.lower(): email for email in diff.unchanged}
+    carried = {}
+    for email, previous in snapshot["users"].items():
+        if "prioritized" not in previous.get("sources", []):
+            continue
+        if email not in unchanged:
+            return None
+        carried[unchanged[email]] = {
+            "score": previous.get("priority_score"),
+            "reason": previous.get("priority_reason")
+        }
+    return carried
+
+def _speculative_urls(users_to_analyze: List[User], state: AgentState) -> List[str]:
+    """LinkedIn-URL-er til kontaktene som mest sannsynlig blir valgt, innenfor budsjettet.
+    
+    Forhåndsrangeringen vekter allerede rolle og avdeling mot målrollen,
+    ansiennitet og om kontakten har LinkedIn.
+    """
+    budget = state["config"].get("linkedin_prefetch_budget")
+    budget = LINKEDIN_PREFETCH_BUDGET if budget is None else budget
+    if budget <= 0 or not users_to_analyze:
+        return []
+    ranked = users_to_analyze
+    if "prerank_score" not in ranked[0]:
+        ranked = prerank_users(users_to_analyze, state["config"]["target_role"])
+    urls = []
+    for user in ranked:
+        if user.get("linkedin_url") and user["linkedin_url"] not in urls:
+            urls.append(user["linkedin_url"])
+            if len(urls) >= budget:
+                break
+    return urls
+
+class SpeculativePrefetch:
+    """Spekulative LinkedIn-hentinger startet mens prioriteringen pågår.
+    
+    Hentingene fortsetter etter at noden er ferdig, og get_linkedin_info deler
+    kall som fortsatt pågår. Når utvalget er klart, avbrytes de som ikke har
+    startet, så de ikke holder av plass for get_linkedin_info sine hentinger.
+    Av samme grunn droppes en henting når alle RapidAPI-plassene er i bruk.
+    Startede hentinger fullføres og blir liggende i cachen.
+    """
+    
+    # Referanser til async-tasks, så de ikke samles opp før de er ferdige
+    _tasks: set = set()
+    
+    def __init__(self):
+        self.pending: Dict[str, object] = {}  # url -> Future eller Task
+        self.started: set = set()
+    
+    @classmethod
+    def start(cls, users_to_analyze: List[User], state: AgentState, messages: List[BaseMessage]) -> "SpeculativePrefetch":
+        prefetch = cls()
+        urls = _speculative_urls(users_to_analyze, state)
+        if not urls:
+            return prefetch
+        
+        def fetch(url: str) -> None:
+            if provider_busy("rapidapi"):
+                return
+            prefetch.started.add(url)
+            prefetch_linkedin_profile(url)
+        
+        executor = ContextThreadPoolExecutor(max_workers=min(LINKEDIN_PREFETCH_CONCURRENCY, len(urls)))
+        for url in urls:
+            prefetch.pending[url] = executor.submit(fetch, url)
+        executor.shutdown(wait=False)
+        messages.append(HumanMessage(content=f"Forhåndshenter {len(urls)} LinkedIn-profiler mens prioriteringen pågår"))
+        return prefetch
+    
+    @classmethod
+    def astart(cls, users_to_analyze: List[User], state: AgentState, messages: List[BaseMessage]) -> "SpeculativePrefetch":
+        """Async variant av start()"""
+        prefetch = cls()
+        urls = _speculative_urls(users_to_analyze, state)
+        if not urls:
+            return prefetch
+        semaphore = asyncio.Semaphore(LINKEDIN_PREFETCH_CONCURRENCY)
+        
+        async def fetch(url: str) -> None:
+            async with semaphore:
+                if provider_busy("rapidapi"):
+                    return
+                prefetch.started.add(url)
+                await aprefetch_linkedin_profile(url)
+        
+        for url in urls:
+            task = asyncio.ensure_future(fetch(url))
+            cls._tasks.add(task)
+            task.add_done_callback(cls._tasks.discard)
+            prefetch.pending[url] = task
+        messages.append(HumanMessage(content=f"Forhåndshenter {len(urls)} LinkedIn-profiler mens prioriteringen pågår"))
+        return prefetch
+    
+    def finish(self, result: AgentState) -> AgentState:
+        """Avbryter hentinger som ikke har startet og teller treff i utvalget i result"""
+        if not self.pending:
+            return result
+        for url, future in self.pending.items():
+            if url not in self.started:
+                future.cancel()
+        started = set(self.started)
+        hits = len(started & {u.get("linkedin_url") for u in result["users"]})
+        result["messages"].append(HumanMessage(
+            content=f"Forhåndshentet {len(started)} av {len(self.pending)} LinkedIn-profiler, {hits} kom med i utvalget"
+        ))
+        return result
+
+def _priority_args(state: AgentState, batch: List[dict]) -> dict:
+    return dict(
+        role=state['config']['target_role'],
+        max_results=state['config'].get('max_results', 5),
+        users=json.dumps(batch, indent=2)
+    )
+
+def _reduce_chunks(outcomes: List, state: AgentState, messages: List[BaseMessage]) -> Dict[str, dict]:
+    """Slår sammen delresultatene til globalt topp max_results. Feiler bare hvis alle deler feilet."""
+    scores, errors = {}, []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            errors.append(outcome)
+            messages.append(HumanMessage(content=f"Feil i prioritering av del {index + 1}/{len(outcomes)}: {str(outcome)}"))
+        else:
+            scores.update(outcome)
+    if len(errors) == len(outcomes):
+        raise errors[0]
+    
+    messages.append(HumanMessage(content=f"Prioriterte i {len(outcomes)} deler"))
+    return _top_scores(scores, state)
+
+def _top_scores(scores: Dict[str, dict], state: AgentState) -> Dict[str, dict]:
+    ranked = sorted(scores.items(), key=lambda item: _score(item[1]), reverse=True)
+    return dict(ranked[:state['config'].get('max_results', 5)])
+
+def _apply_priorities(
+    users_to_analyze: List[User],
+    selected: Dict[str, dict],
+    messages: List[BaseMessage],
+    carried: Dict[str, dict],
+    state: AgentState
+) -> AgentState:
+    """Oppdater brukere med prioriteringer. Videreførte prioriteringer konkurrerer
+    med de nye om plassene i utvalget."""
+    if carried:
+        selected = _top_scores({**carried, **selected}, state)
     prioritized = []
-    for user in users_to_analyze:
-        analysis_result = analysis.users.get(user["email"])
+    for user in users_to_analyze + [state["users"][email] for email in carried]:
+        analysis_result = selected.get(user["email"])
         if analysis_result:  # Ta med alle som ble valgt av LLM
             prioritized.append({
                 **user,
@@ -219,29 +815,53 @@ def prioritize_users(state: AgentState, config: RunnableConfig) -> AgentState:
                 "sources": user.get("sources", []) + ["prioritized"]
             })
     
+    messages.append(HumanMessage(content=f"Analyserte {len(users_to_analyze)} brukere, prioriterte {len(prioritized)}"))
     return {
-        "messages": [HumanMessage(content=f"Analyserte {len(users_to_analyze)} brukere, prioriterte {len(prioritized)}")],
+        "messages": messages,
         "users": prioritized
     }
 
+def _chunk_by_tokens(candidates: List[dict], budget: int) -> List[List[dict]]:
+    """Deler kandidatene i deler der hver del holder seg innenfor token-budsjettet"""
+    chunks, current, used = [], [], 0
+    for candidate in candidates:
+        tokens = estimate_tokens(json.dumps(candidate, indent=2))
+        if current and used + tokens > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(candidate)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _score(analysis_result: dict) -> float:
+    try:
+        return float(analysis_result.get("score", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
 # 5. LINKEDIN NODE (SISTE STEG)
 class LinkedInAnalysis(BaseModel):
     """Strukturert analyse av LinkedIn profil"""
+    # Bare subjektive felter. Erfaring, tid i bedrift, utdanningsnivå og
+    # nettverksstyrke beregnes lokalt i features.py.
     summary: str = Field(description="Kort profesjonell oppsummering")
-    experience_years: int = Field(description="Totalt antall års relevant erfaring")
-    current_company_years: float = Field(description="Antall år i nåværende bedrift")
     key_skills: List[str] = Field(description="Liste over relevante ferdigheter for målrollen")
     leadership_experience: bool = Field(description="Har personen ledererfaring")
-    education_level: str = Field(
-        description="Høyeste utdanningsnivå: 'Videregående', 'Bachelor', 'Master', 'PhD', eller 'Ukjent'"
-    )
     profile_type: str = Field(description="Klassifisering av karrieretype")
     personality_traits: List[dict] = Field(description="Personlighetstrekk utledet fra profilen")
     career_pattern: dict = Field(description="Analyse av karrieremønster")
     education_pattern: dict = Field(description="Mønster i utdanning")
-    network_strength: dict = Field(description="Nettverksstyrke: followers og connections")
     fun_facts: List[str] = Field(description="Interessante fakta om personen")
 
+# Feltene en LinkedIn-berikelse legger til på brukeren
+ENRICHMENT_FIELDS = tuple(LinkedInAnalysis.model_fields) + FEATURE_FIELDS
+
+class LinkedInBatchAnalysis(BaseModel):
+    """Analyser av flere LinkedIn-profiler i ett kall"""
+    profiles: Dict[str, LinkedInAnalysis] = Field(description="Dictionary med email som nøkkel og analyse som verdi")
+
 @traceable(
     run_type="chain",
     name="get_linkedin_info",
@@ -250,94 +870,803 @@ class LinkedInAnalysis(BaseModel):
 def get_linkedin_info(state: AgentState, config: RunnableConfig) -> AgentState:
     """Beriker prioriterte brukere med LinkedIn data og analyse."""
     
-    # Finn prioriterte brukere med LinkedIn URL og score
-    prioritized_users = [
-        u for u in state["users"] 
-        if "prioritized" in u.get("sources", [])  # Sjekk at de er prioritert
-        and u.get("linkedin_url")                 # Sjekk at de har LinkedIn URL
-        and u.get("priority_score", 0) > 0        # Sjekk at de har fått en score
-    ]
-    
+    prioritized_users = _linkedin_candidates(state)
     if not prioritized_users:
         return {
             "messages": [HumanMessage(content="Ingen brukere nådde LinkedIn-terskelen")],
-            "users": state["users"]  # Behold alle brukere, men uten LinkedIn-berikelse
+            "users": []  # Behold alle brukere, men uten LinkedIn-berikelse
         }
     
-    # Setup LLM med strukturert output
-    model = ChatOpenAI(
-        model=DEFAULT_MODEL,
-        temperature=DEFAULT_TEMPERATURE,
-        api_key=os.getenv("OPENAI_API_KEY")  # Bruk API-nøkkel direkte
-    ).with_structured_output(
-        LinkedInAnalysis,
-        method="json_mode"
-    )
+    # Uendrede kontakter beholder analysen fra forrige kjøring
+    reused, prioritized_users = _reused_enrichment(prioritized_users, state, config)
+    if not prioritized_users:
+        return _collect_enrichment(reused)
+    
+    model = _structured_model(LinkedInAnalysis)
     
     # Hold styr på hvilke brukere som er oppdatert
-    updated_users = {user["email"]: user for user in state["users"]}
+    updated_users = state["users"]
     
-    analysis_messages = []
+    if _linkedin_batch_size(state) > 1 and len(prioritized_users) > 1:
+        return _collect_enrichment(reused + _enrich_in_batches(prioritized_users, updated_users, model, state, config))
+    
+    def enrich(user: User):
+        return _enrich_user(user, updated_users[user["email"]], model, state, config)
+    
+    # Kjør berikelsen med begrenset parallellitet. map() gir resultatene
+    # tilbake i samme rekkefølge som prioritized_users uansett fullføringstid.
+    concurrency = _linkedin_concurrency(state)
+    if concurrency == 1 or len(prioritized_users) == 1:
+        results = [enrich(user) for user in prioritized_users]
+    else:
+        with ContextThreadPoolExecutor(max_workers=min(concurrency, len(prioritized_users))) as executor:
+            results = list(executor.map(enrich, prioritized_users))
     
+    return _collect_enrichment(reused + results)
+
+@traceable(
+    run_type="chain",
+    name="get_linkedin_info",
+    metadata={"tool": "linkedin"}
+)
+async def aget_linkedin_info(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async variant av get_linkedin_info()"""
+    
+    prioritized_users = _linkedin_candidates(state)
+    if not prioritized_users:
+        return {
+            "messages": [HumanMessage(content="Ingen brukere nådde LinkedIn-terskelen")],
+            "users": []
+        }
+    
+    reused, prioritized_users = await asyncio.to_thread(_reused_enrichment, prioritized_users, state, config)
+    if not prioritized_users:
+        return _collect_enrichment(reused)
+    
+    model = _structured_model(LinkedInAnalysis)
+    updated_users = state["users"]
+    if _linkedin_batch_size(state) > 1 and len(prioritized_users) > 1:
+        return _collect_enrichment(reused + await _aenrich_in_batches(prioritized_users, updated_users, model, state, config))
+    
+    semaphore = asyncio.Semaphore(_linkedin_concurrency(state))
+    
+    async def enrich(user: User):
+        async with semaphore:
+            return await _aenrich_user(user, updated_users[user["email"]], model, state, config)
+    
+    # gather() bevarer rekkefølgen til prioritized_users
+    results = await asyncio.gather(*(enrich(user) for user in prioritized_users))
+    
+    return _collect_enrichment(reused + list(results))
+
+def _linkedin_candidates(state: AgentState) -> List[User]:
+    """Finn prioriterte brukere med LinkedIn URL og score"""
+    return [
+        u for u in state["users"].values()
+        if "prioritized" in u.get("sources", [])  # Sjekk at de er prioritert
+        and u.get("linkedin_url")                 # Sjekk at de har LinkedIn URL
+        and u.get("priority_score", 0) > 0        # Sjekk at de har fått en score
+    ]
+
+def _reused_enrichment(users: List[User], state: AgentState, config: RunnableConfig):
+    """Deler brukerne i de som kan gjenbruke forrige kjørings LinkedIn-analyse og de som gjenstår.
+    
+    Gjenbrukte brukere returneres i samme form som _enrich_user(), med én
+    samlet melding først. Lokalt beregnede felter er fra forrige kjøring.
+    """
+    snapshot = _previous_snapshot(state)
+    if not snapshot:
+        return [], users
+    results, pending = [], []
+    for user in users:
+        previous = previous_user(snapshot, user["email"])
+        if previous and "linkedin_analyzed" in previous.get("sources", []) and not is_changed(previous, user):
+            enriched_user = {
+                **user,
+                **{field: previous[field] for field in ENRICHMENT_FIELDS if field in previous},
+                "sources": user.get("sources", []) + ["linkedin_analyzed"]
+            }
+            emit_event(config, {"type": "user_enriched", "user": enriched_user})
+            results.append(([], enriched_user))
+        else:
+            pending.append(user)
+    if results:
+        results.insert(0, ([HumanMessage(content=f"Gjenbrukte LinkedIn-analyse for {len(results)} uendrede kontakter")], None))
+    return results, pending
+
+def _linkedin_concurrency(state: AgentState) -> int:
+    return max(1, state["config"].get("linkedin_concurrency") or LINKEDIN_CONCURRENCY)
+
+def _linkedin_batch_size(state: AgentState) -> int:
+    return max(1, state["config"].get("linkedin_batch_size") or LINKEDIN_BATCH_SIZE)
+
+def _collect_enrichment(results: List[tuple]) -> AgentState:
+    analysis_messages = []
     enriched = []
+    for messages, enriched_user in results:
+        analysis_messages.extend(messages)
+        if enriched_user:
+            enriched.append(enriched_user)
     
-    for user in prioritized_users:
+    return {
+        "messages": analysis_messages,
+        "users": enriched  # Reduceren vil merge dette med eksisterende brukere
+    }
+
+def _prefetched(user: User, config: RunnableConfig):
+    """Forhåndshenting av profilen startet av pipelinen, eller None"""
+    return (config or {}).get("configurable", {}).get("linkedin_prefetch", {}).get(user["linkedin_url"])
+
+def _fetch_linkedin(user: User, config: RunnableConfig) -> dict:
+    prefetched = _prefetched(user, config)
+    if prefetched is not None:
+        return prefetched.result()
+    return linkedin_tool.invoke(user["linkedin_url"], config=config)
+
+async def _afetch_linkedin(user: User, config: RunnableConfig) -> dict:
+    prefetched = _prefetched(user, config)
+    if prefetched is not None:
+        return await prefetched
+    return await linkedin_tool.ainvoke(user["linkedin_url"], config=config)
+
+def _linkedin_args(state: AgentState, linkedin_data: dict) -> dict:
+    """Promptargumenter med profilen komprimert til token-budsjettet"""
+    condensed = condense_profile(
+        linkedin_data,
+        state['config']['target_role'],
+        state['config'].get('linkedin_profile_tokens') or LINKEDIN_PROFILE_TOKENS
+    )
+    record_tokens_saved(LinkedInAnalysis.__name__, condensed.tokens_saved)
+    return dict(
+        role=state['config']['target_role'],
+        linkedin_data=condensed.text
+    )
+
+def _enrich_user(user: User, current: User, model, state: AgentState, config: RunnableConfig):
+    """Henter og analyserer LinkedIn-profilen til én bruker.
+    
+    Returnerer (meldinger, beriket bruker eller None). Feil isoleres per bruker.
+    """
+    # Gjenoppta: brukeren ble allerede beriket i en avbrutt kjøring av samme tråd
+    enriched_user = _resumed_enrichment(user, config)
+    if enriched_user is None:
         try:
             # 1. Hent LinkedIn data via tool
-            tool_message = ToolMessage(
-                tool_call_id=f"linkedin_fetch_{user['email']}",
-                tool_name="get_linkedin_profile",
-                content=f"Henter LinkedIn-data for {user['email']}"
-            )
-            linkedin_data = linkedin_tool.invoke(user["linkedin_url"], config=config)
+            linkedin_data = _fetch_linkedin(user, config)
             
             # 2. Analyser profilen med LLM
-            analysis = model.invoke(
-                LINKEDIN_ANALYSIS_PROMPT.format(
-                    role=state['config']['target_role'],
-                    linkedin_data=json.dumps(linkedin_data, indent=2)
-                ),
-                config=config
+            analysis = invoke_structured(
+                model, LinkedInAnalysis, LINKEDIN_ANALYSIS_PROMPT, _linkedin_args(state, linkedin_data), state, config
             )
             
-            # Oppdater bruker med LinkedIn data
-            enriched_user = updated_users[user["email"]].copy()
-            enriched_user.update({
-                **{k: getattr(analysis, k) for k in [
-                    "summary", "experience_years", "key_skills", "leadership_experience", 
-                    "education_level", "profile_type", "personality_traits", "career_pattern",
-                    "education_pattern", "network_strength", "fun_facts"
-                ]},
-                "sources": user.get("sources", []) + ["linkedin_analyzed"]
-            })
-            updated_users[user["email"]] = enriched_user
+            enriched_user = _apply_analysis(user, current, analysis, linkedin_data)
             
-            analysis_messages.extend([
-                tool_message,
-                ToolMessage(
-                    tool_call_id=f"linkedin_analysis_{user['email']}",
-                    tool_name="analyze_linkedin",
-                    content=f"Analyserte LinkedIn-profil for {user['email']}"
-                )
-            ])
+        except Exception as e:
+            return _enrichment_error(user, e)
+        
+        _save_enrichment(user, config, enriched_user)
+    
+    emit_event(config, {"type": "user_enriched", "user": enriched_user})
+    return _enrichment_result(user, enriched_user)
+
+async def _aenrich_user(user: User, current: User, model, state: AgentState, config: RunnableConfig):
+    """Async variant av _enrich_user()"""
+    enriched_user = await _aresumed_enrichment(user, config)
+    if enriched_user is None:
+        try:
+            linkedin_data = await _afetch_linkedin(user, config)
             
-            enriched.append(enriched_user)
+            analysis = await ainvoke_structured(
+                model, LinkedInAnalysis, LINKEDIN_ANALYSIS_PROMPT, _linkedin_args(state, linkedin_data), state, config
+            )
+            
+            enriched_user = _apply_analysis(user, current, analysis, linkedin_data)
             
         except Exception as e:
-            analysis_messages.append(
-                ToolMessage(
-                    tool_call_id=f"linkedin_error_{user['email']}",
-                    tool_name="get_linkedin_info",
-                    content=f"Feil ved prosessering av LinkedIn-data for {user['email']}: {str(e)}"
-                )
+            return _enrichment_error(user, e)
+        
+        await _asave_enrichment(user, config, enriched_user)
+    
+    emit_event(config, {"type": "user_enriched", "user": enriched_user})
+    return _enrichment_result(user, enriched_user)
+
+def _enrich_in_batches(users: List[User], updated_users: Dict[str, User], model, state: AgentState, config: RunnableConfig) -> List[tuple]:
+    """Batchet berikelse: henter profilene parallelt og analyserer K profiler per LLM-kall.
+    
+    Returnerer resultater i samme form og rekkefølge som _enrich_user(), pluss
+    eventuelle meldinger om batcher som falt tilbake til analyse per bruker.
+    """
+    results, pending = _resumed_batch_users(users, config)
+    
+    def fetch(user: User):
+        try:
+            return user, _fetch_linkedin(user, config)
+        except Exception as e:
+            return user, e
+    
+    def analyze(batch: List[tuple]):
+        return _analyze_batch(batch, updated_users, model, state, config)
+    
+    notes = []
+    if pending:
+        with ContextThreadPoolExecutor(max_workers=min(_linkedin_concurrency(state), len(pending))) as executor:
+            batches = _profile_batches(list(executor.map(fetch, pending)), state, results)
+            for batch_results, note in executor.map(analyze, batches):
+                results.update(batch_results)
+                notes.extend(note)
+    return [results[user["email"]] for user in users] + [(notes, None)]
+
+async def _aenrich_in_batches(users: List[User], updated_users: Dict[str, User], model, state: AgentState, config: RunnableConfig) -> List[tuple]:
+    """Async variant av _enrich_in_batches()"""
+    results, pending = await asyncio.to_thread(_resumed_batch_users, users, config)
+    semaphore = asyncio.Semaphore(_linkedin_concurrency(state))
+    
+    async def fetch(user: User):
+        async with semaphore:
+            try:
+                return user, await _afetch_linkedin(user, config)
+            except Exception as e:
+                return user, e
+    
+    async def analyze(batch: List[tuple]):
+        async with semaphore:
+            return await _aanalyze_batch(batch, updated_users, model, state, config)
+    
+    notes = []
+    batches = _profile_batches(await asyncio.gather(*(fetch(user) for user in pending)), state, results)
+    for batch_results, note in await asyncio.gather(*(analyze(batch) for batch in batches)):
+        results.update(batch_results)
+        notes.extend(note)
+    return [results[user["email"]] for user in users] + [(notes, None)]
+
+def _resumed_batch_users(users: List[User], config: RunnableConfig):
+    """Deler brukerne i ferdige (fra en avbrutt kjøring) og de som gjenstår"""
+    results, pending = {}, []
+    for user in users:
+        enriched_user = _resumed_enrichment(user, config)
+        if enriched_user is None:
+            pending.append(user)
+        else:
+            emit_event(config, {"type": "user_enriched", "user": enriched_user})
+            results[user["email"]] = _enrichment_result(user, enriched_user)
+    return results, pending
+
+def _profile_batches(fetched: List[tuple], state: AgentState, results: Dict[str, tuple]) -> List[List[tuple]]:
+    """Grupperer hentede profiler i batcher. Feilede hentinger legges rett i results."""
+    profiles = []
+    for user, outcome in fetched:
+        if isinstance(outcome, Exception):
+            results[user["email"]] = _enrichment_error(user, outcome)
+        else:
+            profiles.append((user, outcome))
+    size = _linkedin_batch_size(state)
+    return [profiles[i:i + size] for i in range(0, len(profiles), size)]
+
+def _analyze_batch(batch: List[tuple], updated_users: Dict[str, User], model, state: AgentState, config: RunnableConfig):
+    """Analyserer en batch i ett kall. Profiler uten gyldig svar analyseres enkeltvis."""
+    try:
+        analyses = _batch_analyses(invoke_structured(
+            _structured_model(LinkedInBatchAnalysis), LinkedInBatchAnalysis, LINKEDIN_BATCH_ANALYSIS_PROMPT,
+            _linkedin_batch_args(state, batch), state, config
+        ))
+        error = None
+    except Exception as e:
+        analyses, error = {}, e
+    
+    results = {}
+    for user, linkedin_data in batch:
+        try:
+            analysis = analyses.get(user["email"].lower()) or invoke_structured(
+                model, LinkedInAnalysis, LINKEDIN_ANALYSIS_PROMPT, _linkedin_args(state, linkedin_data), state, config
             )
+            results[user["email"]] = _finish_enrichment(user, _apply_analysis(user, updated_users[user["email"]], analysis, linkedin_data), config)
+        except Exception as e:
+            results[user["email"]] = _enrichment_error(user, e)
+    return results, _batch_notes(batch, analyses, error)
+
+async def _aanalyze_batch(batch: List[tuple], updated_users: Dict[str, User], model, state: AgentState, config: RunnableConfig):
+    """Async variant av _analyze_batch()"""
+    try:
+        analyses = _batch_analyses(await ainvoke_structured(
+            _structured_model(LinkedInBatchAnalysis), LinkedInBatchAnalysis, LINKEDIN_BATCH_ANALYSIS_PROMPT,
+            _linkedin_batch_args(state, batch), state, config
+        ))
+        error = None
+    except Exception as e:
+        analyses, error = {}, e
+    
+    results = {}
+    for user, linkedin_data in batch:
+        try:
+            analysis = analyses.get(user["email"].lower()) or await ainvoke_structured(
+                model, LinkedInAnalysis, LINKEDIN_ANALYSIS_PROMPT, _linkedin_args(state, linkedin_data), state, config
+            )
+            results[user["email"]] = await _afinish_enrichment(user, _apply_analysis(user, updated_users[user["email"]], analysis, linkedin_data), config)
+        except Exception as e:
+            results[user["email"]] = _enrichment_error(user, e)
+    return results, _batch_notes(batch, analyses, error)
+
+def _batch_analyses(result: LinkedInBatchAnalysis) -> Dict[str, LinkedInAnalysis]:
+    return {email.strip().lower(): analysis for email, analysis in result.profiles.items()}
+
+def _linkedin_batch_args(state: AgentState, batch: List[tuple]) -> dict:
+    """Promptargumenter for en batch: komprimerte profiler i ett JSON-objekt med email som nøkkel"""
+    budget = state['config'].get('linkedin_profile_tokens') or LINKEDIN_PROFILE_TOKENS
+    entries = []
+    for user, linkedin_data in batch:
+        condensed = condense_profile(linkedin_data, state['config']['target_role'], budget)
+        record_tokens_saved(LinkedInBatchAnalysis.__name__, condensed.tokens_saved)
+        entries.append(f"{json.dumps(user['email'])}:{condensed.text}")
+    return dict(
+        role=state['config']['target_role'],
+        profiles="{" + ",\n".join(entries) + "}"
+    )
+
+def _batch_notes(batch: List[tuple], analyses: Dict[str, LinkedInAnalysis], error: Optional[Exception]) -> List[BaseMessage]:
+    missing = [user["email"] for user, _ in batch if user["email"].lower() not in analyses]
+    if not missing:
+        return []
+    # Bare feiltypen: parse-feil inneholder hele svaret fra modellen
+    reason = f"ugyldig batch-svar: {type(error).__name__}" if error else "mangler i batch-svaret"
+    return [HumanMessage(content=f"Analyserte {len(missing)} av {len(batch)} profiler enkeltvis ({reason})")]
+
+def _finish_enrichment(user: User, enriched_user: User, config: RunnableConfig):
+    _save_enrichment(user, config, enriched_user)
+    emit_event(config, {"type": "user_enriched", "user": enriched_user})
+    return _enrichment_result(user, enriched_user)
+
+async def _afinish_enrichment(user: User, enriched_user: User, config: RunnableConfig):
+    await _asave_enrichment(user, config, enriched_user)
+    emit_event(config, {"type": "user_enriched", "user": enriched_user})
+    return _enrichment_result(user, enriched_user)
+
+def _progress_key(user: User, config: RunnableConfig) -> Optional[str]:
+    """Nøkkel for fremdrift per bruker innenfor en checkpointet tråd"""
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    return f"{thread_id}:{user['email']}" if thread_id else None
+
+def _resumed_enrichment(user: User, config: RunnableConfig) -> Optional[User]:
+    key = _progress_key(user, config)
+    if not key:
+        return None
+    entry = enrichment_progress.get(key)
+    return entry.value if entry else None
+
+def _save_enrichment(user: User, config: RunnableConfig, enriched_user: User) -> None:
+    key = _progress_key(user, config)
+    if key:
+        enrichment_progress.set(key, enriched_user)
+
+# Fremdriften ligger i SQLite; async-variantene gjør oppslaget i en tråd
+async def _aresumed_enrichment(user: User, config: RunnableConfig) -> Optional[User]:
+    if not _progress_key(user, config):
+        return None
+    return await asyncio.to_thread(_resumed_enrichment, user, config)
+
+async def _asave_enrichment(user: User, config: RunnableConfig, enriched_user: User) -> None:
+    if _progress_key(user, config):
+        await asyncio.to_thread(_save_enrichment, user, config, enriched_user)
+
+def _apply_analysis(user: User, current: User, analysis: LinkedInAnalysis, linkedin_data: dict) -> User:
+    """Oppdater bruker med LinkedIn data: LLM-analysen pluss lokalt beregnede felter"""
+    enriched_user = current.copy()
+    enriched_user.update({
+        **analysis.model_dump(),
+        **extract_features(linkedin_data),
+        "sources": user.get("sources", []) + ["linkedin_analyzed"]
+    })
+    return enriched_user
+
+def _enrichment_result(user: User, enriched_user: User):
+    return [
+        ToolMessage(
+            tool_call_id=f"linkedin_fetch_{user['email']}",
+            tool_name="get_linkedin_profile",
+            content=f"Henter LinkedIn-data for {user['email']}"
+        ),
+        ToolMessage(
+            tool_call_id=f"linkedin_analysis_{user['email']}",
+            tool_name="analyze_linkedin",
+            content=f"Analyserte LinkedIn-profil for {user['email']}"
+        )
+    ], enriched_user
+
+def _enrichment_error(user: User, error: Exception):
+    return [
+        ToolMessage(
+            tool_call_id=f"linkedin_error_{user['email']}",
+            tool_name="get_linkedin_info",
+            content=f"Feil ved prosessering av LinkedIn-data for {user['email']}: {str(error)}"
+        )
+    ], None
+
+# 6. PIPELINET MODUS
+class ProspectPipeline:
+    """Tilstand for en pipelinet kjøring: Hunter-sider, forhåndsrangering,
+    prioriteringsdeler og bekreftede valg.
+    
+    Sidene rangeres etter hvert som de kommer inn (PrerankIndex), og sterke
+    kandidater sendes til prioritering i små deler mens resten av sidene hentes.
+    Klassen har ingen samtidighet selv; run_pipelined() og arun_pipelined()
+    driver den.
+    
+    Ved inkrementelt søk brukes øyeblikksbildet bare til å gjenbruke
+    LinkedIn-analyser: diffen krever hele kontaktlisten, og den kan være
+    kuttet av tidlig stopp.
+    """
+    
+    def __init__(self, state: AgentState):
+        self.state = state
+        self.users: Dict[str, User] = {}
+        self.index = PrerankIndex(state["config"]["target_role"])
+        self.ranked: List[User] = []
+        self.collected = False
+        self.shortlist: List[User] = []
+        self.dispatched: Dict[str, User] = {}
+        self.outcomes: List = []
+        self.confirmed: set = set()
+        self.messages: List[BaseMessage] = []
+        self.total: Optional[int] = None
+        self.complete = True
+        self.stopped_early = False
+        self.top_n = state["config"].get("prerank_top_n", PRERANK_TOP_N)
+        self.max_results = state["config"].get("max_results") or 5
+        self.chunk_tokens = state["config"].get("pipeline_chunk_tokens") or PIPELINE_CHUNK_TOKENS
+    
+    def add_contacts(self, users: List[User], messages: List[BaseMessage]) -> None:
+        self.messages.extend(messages)
+        for user in users:
+            self.users[user["email"]] = user
+        self.ranked = self.index.add(u for u in users if u.get("role"))
+    
+    def finish_collection(self) -> None:
+        """Alle sider er hentet eller droppet: endelig rangering med IDF over alle kontaktene"""
+        self.ranked = self.index.finish()
+        self.collected = True
+    
+    def add_page(self, offset: int, result: tuple) -> None:
+        hunter_data, error = result
+        if error:
+            self.complete = False
+            self.messages.append(HunterDataCollector._error_message(offset, error))
+            return
+        if offset == 0:
+            self.total = hunter_data["meta"]["total"]
+        self.add_contacts(
+            [HunterDataCollector._to_user(email) for email in hunter_data["emails"]],
+            [ToolMessage(
+                tool_call_id=f"hunter_batch_{offset}",
+                tool_name="hunter_collection",
+                content=f"Hentet {len(hunter_data['emails'])} kontakter"
+            )]
+        )
+    
+    def strong_candidates(self) -> List[User]:
+        """Kandidater med høy nok forhåndsscore til å gå til prioritering før alle sider er hentet.
+        
+        Terskelen er relativ til den beste så langt, siden TF-IDF-likheten
+        avhenger av hvordan målrollen og domenets titler er formulert.
+        """
+        if not self.ranked:
+            return []
+        threshold = self.ranked[0]["prerank_score"] * PIPELINE_STRONG_FRACTION
+        strong = takewhile(lambda u: u["prerank_score"] >= threshold, self.ranked)
+        return [u for u in strong if u.get("linkedin_url")]
+    
+    def enough(self) -> bool:
+        """Nok sterke kandidater til max_results, så resten av sidene kan droppes"""
+        return len(self.strong_candidates()) >= self.max_results * PIPELINE_CANDIDATE_FACTOR
     
+    def stop_early(self, skipped_pages: int) -> None:
+        self.stopped_early = True
+        self.complete = False
+        self.messages.append(HumanMessage(
+            content=f"Stoppet Hunter-paginering etter {len(self.users)} av {self.total} kontakter "
+                    f"({len(self.strong_candidates())} sterke kandidater, {skipped_pages} sider hoppet over)"
+        ))
+    
+    def take_chunks(self, final: bool) -> List[List[dict]]:
+        """Nye deler å prioritere. Før siste side sendes bare fulle deler med sterke kandidater."""
+        if final and not self.collected:
+            self.finish_collection()
+        pool = self.ranked if final else self.strong_candidates()
+        pool = [u for u in pool if u["email"] not in self.dispatched]
+        if self.top_n:
+            pool = pool[:max(0, self.top_n - len(self.dispatched))]
+        chunks = _chunk_by_tokens([_candidate(u) for u in pool], self.chunk_tokens)
+        if not final:
+            chunks = chunks[:-1]  # Siste del er ikke full ennå
+        users = {u["email"]: u for u in pool}
+        for chunk in chunks:
+            for candidate in chunk:
+                self.dispatched[candidate["email"]] = users[candidate["email"]]
+        return chunks
+    
+    def add_scores(self, outcome) -> List[User]:
+        """Legger til resultatet av én del. Returnerer nye bekreftede valg.
+        
+        Et valg er bekreftet når det er blant de max_results beste så langt og
+        har minst PIPELINE_CONFIRM_SCORE. Da starter LinkedIn-hentingen, selv
+        om senere deler i sjeldne tilfeller kan skyve det ut.
+        """
+        self.outcomes.append(outcome)
+        if isinstance(outcome, BaseException):
+            return []
+        scores = {}
+        for result in self.outcomes:
+            if not isinstance(result, BaseException):
+                scores.update(result)
+        confirmed = []
+        for email, result in _top_scores(scores, self.state).items():
+            user = self.dispatched.get(email)
+            if user and user.get("linkedin_url") and email not in self.confirmed and _score(result) >= PIPELINE_CONFIRM_SCORE:
+                self.confirmed.add(email)
+                confirmed.append(user)
+        return confirmed
+    
+    def selected(self) -> Dict[str, dict]:
+        if not self.outcomes:
+            return {}
+        if len(self.outcomes) == 1 and not isinstance(self.outcomes[0], BaseException):
+            return _top_scores(self.outcomes[0], self.state)
+        return _reduce_chunks(self.outcomes, self.state, self.messages)
+    
+    def prioritized_state(self, selected: Dict[str, dict]) -> AgentState:
+        """State for berikelsen etter at utvalget er klart"""
+        if self.top_n and len(self.ranked) > len(self.dispatched):
+            self.messages.append(HumanMessage(
+                content=f"Forhåndsrangerte {len(self.ranked)} brukere lokalt, sendte {len(self.dispatched)} til analyse"
+            ))
+        self.shortlist = _apply_priorities(list(self.dispatched.values()), selected, self.messages, {}, self.state)["users"]
+        users = {**self.users, **{u["email"]: u for u in self.shortlist}}
+        return {**self.state, "users": users}
+    
+    def result(self, enrichment_state: AgentState, enrichment: AgentState, prefetched: dict) -> AgentState:
+        users = dict(enrichment_state["users"])
+        for user in enrichment["users"]:
+            users[user["email"]] = user
+        if prefetched:
+            shortlisted = {u.get("linkedin_url") for u in users.values() if "prioritized" in u.get("sources", [])}
+            unused = len(set(prefetched) - shortlisted)
+            self.messages.append(HumanMessage(
+                content=f"Startet LinkedIn-henting for {len(prefetched)} bekreftede valg før utvalget var ferdig ({unused} kom ikke med)"
+            ))
+        return {
+            "messages": self.messages + enrichment["messages"],
+            "users": list(users.values())
+        }
+
+def _pipelined(state: AgentState) -> bool:
+    pipelined = state["config"].get("pipelined")
+    return PIPELINED_MODE if pipelined is None else bool(pipelined)
+
+def _with_prefetch(config: RunnableConfig, prefetched: dict) -> RunnableConfig:
+    return {**config, "configurable": {**config.get("configurable", {}), "linkedin_prefetch": prefetched}}
+
+@traceable(
+    run_type="chain",
+    name="pipelined_prospecting",
+    metadata={"type": "pipeline"}
+)
+def run_pipelined(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Hunter-innsamling, prioritering og LinkedIn-berikelse med overlappende steg"""
+    pipeline = ProspectPipeline(state)
+    collector = HunterDataCollector()
+    domain = state["config"]["domain"]
+    fan_out = max(1, state["config"].get("hunter_concurrency") or HUNTER_CONCURRENCY)
+    model = _structured_model(PriorityAnalysis)
+    prefetched = {}
+    
+    def fetch_page(offset: int):
+        result = collector._fetch_page(domain, offset, HUNTER_PAGE_SIZE)
+        collector._emit_progress(config, offset, result)
+        return result
+    
+    def analyze(batch: List[dict]) -> Dict[str, dict]:
+        return invoke_structured(
+            model, PriorityAnalysis, PRIORITY_ANALYSIS_PROMPT, _priority_args(state, batch), state, config
+        ).users
+    
+    offsets = deque()
+    cached = collector._from_cache(domain, fan_out)
+    if cached:
+        pipeline.add_contacts(cached["users"], cached["messages"])
+    else:
+        pipeline.add_page(0, fetch_page(0))
+        if pipeline.total:
+            offsets.extend(range(HUNTER_PAGE_SIZE, pipeline.total, HUNTER_PAGE_SIZE))
+    
+    with ContextThreadPoolExecutor(max_workers=fan_out) as pages, \
+            ContextThreadPoolExecutor(max_workers=PRIORITY_CONCURRENCY) as chunks, \
+            ContextThreadPoolExecutor(max_workers=_linkedin_concurrency(state)) as profiles:
+        running = {}  # future -> ("page", offset) eller ("chunk", None)
+        
+        def schedule() -> None:
+            if offsets and pipeline.enough():
+                pipeline.stop_early(len(offsets))
+                offsets.clear()
+            while offsets and sum(kind == "page" for kind, _ in running.values()) < fan_out:
+                offset = offsets.popleft()
+                running[pages.submit(fetch_page, offset)] = ("page", offset)
+            collecting = any(kind == "page" for kind, _ in running.values())
+            if not collecting and not pipeline.collected:
+                pipeline.finish_collection()
+                emit_event(config, {"type": "hunter_collected", "contacts": len(pipeline.users)})
+            for batch in pipeline.take_chunks(final=not collecting):
+                running[chunks.submit(analyze, batch)] = ("chunk", None)
+        
+        schedule()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, offset = running.pop(future)
+                if kind == "page":
+                    pipeline.add_page(offset, future.result())
+                    continue
+                outcome = future.exception() or future.result()
+                for user in pipeline.add_scores(outcome):
+                    prefetched[user["linkedin_url"]] = profiles.submit(linkedin_tool.invoke, user["linkedin_url"], config=config)
+            schedule()
+        
+        if not cached:
+            collector._store(domain, list(pipeline.users.values()), pipeline.complete)
+        selected = pipeline.selected()
+        if state["config"].get("priority_rerank") and len(pipeline.outcomes) > 1 and selected:
+            selected = analyze([_candidate(pipeline.dispatched[email]) for email in selected])
+        
+        enrichment_state = pipeline.prioritized_state(selected)
+        emit_event(config, {"type": "shortlist", "users": pipeline.shortlist})
+        enrichment = get_linkedin_info(enrichment_state, _with_prefetch(config, prefetched))
+        for future in prefetched.values():
+            future.cancel()
+    return pipeline.result(enrichment_state, enrichment, prefetched)
+
+@traceable(
+    run_type="chain",
+    name="pipelined_prospecting",
+    metadata={"type": "pipeline"}
+)
+async def arun_pipelined(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async variant av run_pipelined()"""
+    pipeline = ProspectPipeline(state)
+    collector = HunterDataCollector()
+    domain = state["config"]["domain"]
+    fan_out = max(1, state["config"].get("hunter_concurrency") or HUNTER_CONCURRENCY)
+    model = _structured_model(PriorityAnalysis)
+    chunk_slots = asyncio.Semaphore(PRIORITY_CONCURRENCY)
+    profile_slots = asyncio.Semaphore(_linkedin_concurrency(state))
+    prefetched = {}
+    
+    async def fetch_page(offset: int):
+        result = await collector._afetch_page(domain, offset, HUNTER_PAGE_SIZE)
+        collector._emit_progress(config, offset, result)
+        return result
+    
+    async def analyze(batch: List[dict]) -> Dict[str, dict]:
+        async with chunk_slots:
+            return (await ainvoke_structured(
+                model, PriorityAnalysis, PRIORITY_ANALYSIS_PROMPT, _priority_args(state, batch), state, config
+            )).users
+    
+    async def prefetch(url: str) -> dict:
+        async with profile_slots:
+            return await linkedin_tool.ainvoke(url, config=config)
+    
+    offsets = deque()
+    cached = collector._from_cache(domain, fan_out, asyncio.get_running_loop())
+    # Rangeringen er CPU-arbeid og kjøres i en tråd, så andre kjøringer på
+    # samme event loop ikke blokkeres
+    if cached:
+        await asyncio.to_thread(pipeline.add_contacts, cached["users"], cached["messages"])
+    else:
+        await asyncio.to_thread(pipeline.add_page, 0, await fetch_page(0))
+        if pipeline.total:
+            offsets.extend(range(HUNTER_PAGE_SIZE, pipeline.total, HUNTER_PAGE_SIZE))
+    
+    running = {}  # task -> ("page", offset) eller ("chunk", None)
+    
+    async def schedule() -> None:
+        if offsets and pipeline.enough():
+            pipeline.stop_early(len(offsets))
+            offsets.clear()
+        while offsets and sum(kind == "page" for kind, _ in running.values()) < fan_out:
+            offset = offsets.popleft()
+            running[asyncio.ensure_future(fetch_page(offset))] = ("page", offset)
+        collecting = any(kind == "page" for kind, _ in running.values())
+        if not collecting and not pipeline.collected:
+            await asyncio.to_thread(pipeline.finish_collection)
+            emit_event(config, {"type": "hunter_collected", "contacts": len(pipeline.users)})
+        for batch in pipeline.take_chunks(final=not collecting):
+            running[asyncio.ensure_future(analyze(batch))] = ("chunk", None)
+    
+    try:
+        await schedule()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                kind, offset = running.pop(task)
+                if kind == "page":
+                    await asyncio.to_thread(pipeline.add_page, offset, task.result())
+                    continue
+                outcome = task.exception() or task.result()
+                for user in pipeline.add_scores(outcome):
+                    prefetched[user["linkedin_url"]] = asyncio.ensure_future(prefetch(user["linkedin_url"]))
+            await schedule()
+        
+        if not cached:
+            collector._store(domain, list(pipeline.users.values()), pipeline.complete)
+        selected = pipeline.selected()
+        if state["config"].get("priority_rerank") and len(pipeline.outcomes) > 1 and selected:
+            selected = await analyze([_candidate(pipeline.dispatched[email]) for email in selected])
+        
+        enrichment_state = pipeline.prioritized_state(selected)
+        emit_event(config, {"type": "shortlist", "users": pipeline.shortlist})
+        enrichment = await aget_linkedin_info(enrichment_state, _with_prefetch(config, prefetched))
+    finally:
+        # Avbrutt kjøring eller valg som ikke kom med i utvalget
+        for task in list(running) + list(prefetched.values()):
+            task.cancel()
+    return pipeline.result(enrichment_state, enrichment, prefetched)
+
+# 7. ØYEBLIKKSBILDE (inkrementelt søk)
+def store_snapshot(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Lagrer resultatet som grunnlag for neste inkrementelle kjøring av domenet og rollen"""
+    if not _incremental(state) or not state["users"]:
+        return {"messages": []}
+    domain, target_role = state["config"]["domain"], state["config"]["target_role"]
+    count = save_snapshot(
+        domain,
+        target_role,
+        state["config"].get("max_results", 5),
+        _snapshot_users(state["users"].values(), load_snapshot(domain, target_role))
+    )
+    return {"messages": [HumanMessage(content=f"Lagret øyeblikksbilde med {count} kontakter")]}
+
+def _snapshot_users(users: Iterable[User], previous: Optional[dict]) -> List[User]:
+    """Brukerne i kjøringen. Uendrede kontakter som falt ut av utvalget beholder
+    analysen fra tidligere, slik at den kan gjenbrukes om de kommer tilbake."""
+    snapshot_users = []
+    for user in users:
+        before = previous_user(previous, user["email"]) if previous else None
+        if (
+            before and "linkedin_analyzed" in before.get("sources", [])
+            and "linkedin_analyzed" not in user.get("sources", []) and not is_changed(before, user)
+        ):
+            user = {
+                **user,
+                **{field: before[field] for field in ENRICHMENT_FIELDS if field in before},
+                "sources": user.get("sources", []) + ["linkedin_analyzed"]
+            }
+        snapshot_users.append(user)
+    return snapshot_users
+
+async def astore_snapshot(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async variant av store_snapshot(). Øyeblikksbildet leses og skrives i en tråd."""
+    return await asyncio.to_thread(store_snapshot, state, config)
+
+# Workflow setup og kompilering -> # Arbeidsflyt oppsett og kompilering
+def _run_tag(state: AgentState, config: RunnableConfig) -> dict:
     return {
-        "messages": analysis_messages,
-        "users": enriched  # Reduceren vil merge dette med eksisterende brukere
+        "domain": state["config"].get("domain"),
+        "target_role": state["config"].get("target_role"),
+        "thread_id": (config or {}).get("configurable", {}).get("thread_id")
     }
 
-# Workflow setup og kompilering -> # Arbeidsflyt oppsett og kompilering
+def _tag_messages(func):
+    """Merker nodens nye meldinger med kjøringen, for hendelsesloggen i compact-modus"""
+    if asyncio.iscoroutinefunction(func):
+        async def async_wrapper(state: AgentState, config: RunnableConfig) -> AgentState:
+            output = await func(state, config)
+            tag_run(output.get("messages", []), _run_tag(state, config))
+            return output
+        return functools.wraps(func)(async_wrapper)
+    
+    def wrapper(state: AgentState, config: RunnableConfig) -> AgentState:
+        output = func(state, config)
+        tag_run(output.get("messages", []), _run_tag(state, config))
+        return output
+    return functools.wraps(func)(wrapper)
+
 def create_workflow() -> StateGraph:
     """Oppretter og konfigurerer workflow."""
     
@@ -346,15 +1675,31 @@ def create_workflow() -> StateGraph:
     # Initialiser collector
     hunter_collector = HunterDataCollector()
     
-    # Legg til noder
-    graph_builder.add_node("hunter_collection", hunter_collector.run)
-    graph_builder.add_node("prioritize_users", prioritize_users)
-    graph_builder.add_node("get_linkedin_info", get_linkedin_info)
+    # Legg til noder. Hver node har både sync- og async-implementasjon,
+    # slik at grafen kan kjøres med invoke() og ainvoke().
+    nodes = {
+        "hunter_collection": (hunter_collector.run, hunter_collector.arun),
+        "prioritize_users": (prioritize_users, aprioritize_users),
+        "get_linkedin_info": (get_linkedin_info, aget_linkedin_info),
+        "pipelined_prospecting": (run_pipelined, arun_pipelined),
+        "store_snapshot": (store_snapshot, astore_snapshot)
+    }
+    for name, (func, afunc) in nodes.items():
+        graph_builder.add_node(name, RunnableLambda(
+            track_node(name, _tag_messages(func)), afunc=track_node(name, _tag_messages(afunc))
+        ))
     
     # Definer flyten
-    graph_builder.add_edge(START, "hunter_collection")
+    # Pipelinet modus gjør alle tre stegene i én node med overlapp mellom dem
+    graph_builder.add_conditional_edges(
+        START,
+        lambda state: "pipelined_prospecting" if _pipelined(state) else "hunter_collection",
+        ["hunter_collection", "pipelined_prospecting"]
+    )
+    graph_builder.add_edge("pipelined_prospecting", "store_snapshot")
     graph_builder.add_edge("hunter_collection", "prioritize_users")
     graph_builder.add_edge("prioritize_users", "get_linkedin_info")
+    graph_builder.add_edge("get_linkedin_info", "store_snapshot")
     
     return graph_builder
 
@@ -365,8 +1710,12 @@ def get_config() -> RunnableConfig:
         metadata={"version": "1.0"}  # Legg til metadata
     )
 
+def compile_workflow(checkpointer=None):
+    """Kompilerer workflow, eventuelt med checkpointer for gjenopptakbare kjøringer."""
+    return create_workflow().compile(checkpointer=checkpointer)
+
 # Compile workflow
-app = create_workflow().compile()
+app = compile_workflow()
 
 # Test
 if __name__ == "__main__":
@@ -383,11 +1732,11 @@ if __name__ == "__main__":
     
     # Print berikede brukere
     print("\nBrukere med LinkedIn-analyse:")
-    for user in result["users"]:
+    for user in result["users"].values():
         if "linkedin_analyzed" in user.get("sources", []):
-            print(f"\n{user['first_name']} {user['last_name']} ({user['email']}):")
+            print(f"\n{user.get('first_name', '')} {user.get('last_name', '')} ({user['email']}):")
             print(f"- Screening: {user.get('screening_score', 0)} - {user.get('screening_reason', 'Ingen begrunnelse')}")
-            print(f"- Poengsum: {user['priority_score']}")
+            print(f"- Poengsum: {user.get('priority_score', 0)}")
             print(f"- Oppsummering: {user.get('summary', 'Ingen oppsummering')}")
             print(f"- Ferdigheter: {', '.join(user.get('key_skills', []))}")
             print(f"- Erfaring: {user.get('experience_years', 0)} år")
\ No newline at end of file
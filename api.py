@@ -1,52 +1,304 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from agent import app as workflow_app, User, get_config
+from typing import Any, Dict, Iterable, List, Optional
+import asyncio
+import json
+import uuid
+from agent import (
+    app as workflow_app, User, get_config, compile_workflow, CHECKPOINT_DB_PATH,
+    PriorityAnalysis, LinkedInAnalysis, DEFAULT_MODEL, DEFAULT_TEMPERATURE
+)
+from llm_clients import warm_up, LLM_WARMUP
+from jobs import JobManager
+from events import event_log
+from singleflight import SingleFlight
+import metrics
+import http_client
 
 class ProspectRequest(BaseModel):
     domain: str
     target_role: str
     max_results: Optional[int] = 5
     search_depth: Optional[int] = 1
+    bypass_llm_cache: Optional[bool] = False
+    incremental: Optional[bool] = None  # Overstyrer INCREMENTAL_PROSPECTING: bare nye og endrede kontakter analyseres
+    pipelined: Optional[bool] = None  # Overstyrer PIPELINED_MODE: overlapp Hunter, prioritering og LinkedIn
+    thread_id: Optional[str] = None  # Gjenoppta en avbrutt kjøring (krever CHECKPOINT_DB_PATH)
 
 class ProspectResponse(BaseModel):
     users: List[User]
     message: str
+    thread_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    items: List[ProspectRequest]
+
+class BatchItemResult(BaseModel):
+    domain: str
+    target_role: str
+    status: str  # queued, running, completed eller failed
+    users: Optional[List[User]] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchJobResponse(BaseModel):
+    job_id: str
+    status: str
+    progress: Dict[str, int]
+    results: Optional[List[BatchItemResult]] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global workflow_app
+    if LLM_WARMUP:
+        await warm_up([PriorityAnalysis, LinkedInAnalysis], DEFAULT_MODEL, DEFAULT_TEMPERATURE)
+    if CHECKPOINT_DB_PATH:
+        # Valgfri avhengighet, bare nødvendig når checkpointing er skrudd på
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB_PATH) as checkpointer:
+            workflow_app = compile_workflow(checkpointer)
+            yield
+    else:
+        yield
+    await job_manager.stop()
+    await http_client.aclose()
 
 app = FastAPI(
     title="Prospect Agent API",
     description="API for å finne og analysere relevante kontakter",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+def _workflow_input(request: ProspectRequest) -> dict:
+    return {
+        "messages": [],
+        "config": {
+            "domain": request.domain,
+            "target_role": request.target_role,
+            "max_results": request.max_results,
+            "search_depth": request.search_depth,
+            "bypass_llm_cache": request.bypass_llm_cache,
+            "incremental": request.incremental,
+            "pipelined": request.pipelined
+        },
+        "users": []
+    }
+
+def _analyzed_users(users: Iterable[User]) -> List[User]:
+    """Filtrer ut bare de som er ferdig analysert"""
+    return [
+        user for user in users
+        if "linkedin_analyzed" in user.get("sources", [])
+    ]
+
+def _run_config(thread_id: Optional[str] = None):
+    """Konfigurasjon for én kjøring. Med checkpointing får hver kjøring en tråd-id."""
+    config = get_config()
+    if CHECKPOINT_DB_PATH:
+        config["configurable"] = {"thread_id": thread_id or uuid.uuid4().hex}
+    return config
+
+async def _run_workflow(request: ProspectRequest, config) -> dict:
+    """Kjører grafen, eller gjenopptar en tidligere kjøring i samme tråd.
+
+    En avbrutt tråd fortsetter fra siste fullførte node. En ferdig tråd
+    returnerer sitt lagrede resultat i stedet for å kjøre på nytt.
+    """
+    if CHECKPOINT_DB_PATH and request.thread_id:
+        snapshot = await workflow_app.aget_state(config)
+        if snapshot.values:
+            if snapshot.next:
+                return await workflow_app.ainvoke(None, config=config)
+            return snapshot.values
+    return await workflow_app.ainvoke(_workflow_input(request), config=config)
+
+# Identiske samtidige søk deler én kjøring av grafen
+prospect_flight = SingleFlight("prospects")
+
+def _prospect_key(request: ProspectRequest) -> tuple:
+    return (
+        request.domain.strip().lower(),
+        request.target_role.strip().lower(),
+        request.max_results,
+        request.search_depth,
+        bool(request.bypass_llm_cache),
+        request.incremental,
+        request.pipelined
+    )
+
+async def _run_prospects(request: ProspectRequest) -> tuple:
+    """(resultat, config) for søket. Gjenopptak av en tråd slås ikke sammen med andre."""
+    async def run():
+        config = _run_config(request.thread_id)
+        return await _run_workflow(request, config), config
+
+    if request.thread_id:
+        return await run()
+    return await prospect_flight.ado(_prospect_key(request), run)
+
 @app.post("/prospects", response_model=ProspectResponse)
 async def find_prospects(request: ProspectRequest):
     """Finn og analyser relevante kontakter basert på domene og målrolle."""
     try:
-        result = workflow_app.invoke({
-            "messages": [],
-            "config": {
-                "domain": request.domain,
-                "target_role": request.target_role,
-                "max_results": request.max_results,
-                "search_depth": request.search_depth
-            },
-            "users": []
-        }, config=get_config())
-        
-        # Filtrer ut bare de som er ferdig analysert
-        analyzed_users = [
-            user for user in result["users"] 
-            if "linkedin_analyzed" in user.get("sources", [])
-        ]
-        
+        result, config = await _run_prospects(request)
+
+        analyzed_users = _analyzed_users(result["users"].values())
+
         return ProspectResponse(
             users=analyzed_users,
-            message=f"Fant {len(analyzed_users)} relevante kontakter med full analyse"
+            message=f"Fant {len(analyzed_users)} relevante kontakter med full analyse",
+            thread_id=config.get("configurable", {}).get("thread_id")
         )
-        
+
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Feil under prosessering: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@app.get("/prospects/{thread_id}", response_model=ProspectResponse)
+async def get_prospect_run(thread_id: str):
+    """Henter lagret tilstand for en checkpointet kjøring."""
+    if not CHECKPOINT_DB_PATH:
+        raise HTTPException(status_code=404, detail="Checkpointing er ikke aktivert")
+    snapshot = await workflow_app.aget_state(_run_config(thread_id))
+    if not snapshot.values:
+        raise HTTPException(status_code=404, detail=f"Fant ikke kjøring {thread_id}")
+
+    analyzed_users = _analyzed_users(snapshot.values.get("users", {}).values())
+    status = f"avbrutt før {', '.join(snapshot.next)}" if snapshot.next else "fullført"
+    return ProspectResponse(
+        users=analyzed_users,
+        message=f"Kjøringen er {status}, {len(analyzed_users)} kontakter med full analyse",
+        thread_id=thread_id
+    )
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def _shortlist_entry(user: User) -> dict:
+    return {
+        "email": user["email"],
+        "name": f"{user.get('first_name', '')} {user.get('last_name', '')}".strip(),
+        "role": user.get("role"),
+        "linkedin_url": user.get("linkedin_url"),
+        "priority_score": user.get("priority_score"),
+        "priority_reason": user.get("priority_reason")
+    }
+
+@app.post("/prospects/stream")
+async def stream_prospects(request: ProspectRequest):
+    """Som /prospects, men strømmer resultater som Server-Sent Events etter hvert som de blir klare.
+
+    Hendelser: hunter_progress, hunter_collected, shortlist, user (én per beriket bruker),
+    done og error.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+
+    # Hendelser fra innsiden av nodene (per Hunter-side og per beriket bruker)
+    def event_sink(event: dict) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    # Strømmen starter alltid en ny kjøring; gjenopptak går via /prospects
+    config = _run_config()
+    config.setdefault("configurable", {})["event_sink"] = event_sink
+
+    async def run_workflow():
+        analyzed = 0
+        try:
+            # Node-oppdateringer fra LangGraph
+            async for update in workflow_app.astream(_workflow_input(request), config=config, stream_mode="updates"):
+                for node, output in update.items():
+                    users = (output or {}).get("users", [])
+                    if node == "hunter_collection":
+                        queue.put_nowait({"type": "hunter_collected", "contacts": len(users)})
+                    elif node == "prioritize_users":
+                        queue.put_nowait({"type": "shortlist", "users": users})
+                    elif node in ("get_linkedin_info", "pipelined_prospecting"):
+                        # Den pipelinede noden sender hunter_collected og shortlist
+                        # via event_sink når de er klare, før berikelsen
+                        analyzed = len(_analyzed_users(users))
+            queue.put_nowait({
+                "type": "done",
+                "message": f"Fant {analyzed} relevante kontakter med full analyse",
+                "thread_id": config.get("configurable", {}).get("thread_id")
+            })
+        except Exception as e:
+            queue.put_nowait({"type": "error", "detail": f"Feil under prosessering: {str(e)}"})
+        finally:
+            queue.put_nowait(None)
+
+    async def events():
+        task = asyncio.create_task(run_workflow())
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                event_type = event.pop("type")
+                if event_type == "user_enriched":
+                    yield _sse("user", event["user"])
+                elif event_type == "shortlist":
+                    yield _sse("shortlist", {"users": [_shortlist_entry(u) for u in event["users"]]})
+                else:
+                    yield _sse(event_type, event)
+        finally:
+            # Klienten koblet fra: stopp arbeidet
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _run_batch_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Kjører ett (domene, målrolle)-par for en batch-jobb"""
+    result = await workflow_app.ainvoke(_workflow_input(ProspectRequest(**item)), config=_run_config())
+    analyzed_users = _analyzed_users(result["users"].values())
+    return {
+        "users": analyzed_users,
+        "message": f"Fant {len(analyzed_users)} relevante kontakter med full analyse"
+    }
+
+job_manager = JobManager(_run_batch_item)
+
+@app.post("/jobs", response_model=BatchJobResponse, status_code=202)
+async def create_batch_job(request: BatchRequest):
+    """Starter en batch-jobb for mange domener. Kjøres av en delt worker-pool."""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch-jobben må ha minst ett element")
+    job = job_manager.submit([item.model_dump() for item in request.items])
+    return BatchJobResponse(job_id=job.id, status=job.status, progress=job.progress())
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus-metrikker for noder, upstream-kall, LLM-bruk og cacher."""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+@app.get("/events")
+async def get_events(limit: int = 100, domain: Optional[str] = None, thread_id: Optional[str] = None):
+    """De siste detaljerte hendelsene fra ringbufferen (fylles i compact-modus).
+
+    Hver hendelse har kjøringens domain, target_role og thread_id, og kan filtreres på dem.
+    """
+    return {"events": event_log.recent(limit, domain=domain, thread_id=thread_id), **event_log.stats()}
+
+@app.get("/jobs/{job_id}", response_model=BatchJobResponse)
+async def get_batch_job(job_id: str, include_results: bool = True):
+    """Status, fremdrift og delresultater for en batch-jobb."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Fant ikke jobb {job_id}")
+    return BatchJobResponse(
+        job_id=job.id,
+        status=job.status,
+        progress=job.progress(),
+        results=job.results if include_results else None
+    )
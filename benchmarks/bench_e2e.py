@@ -0,0 +1,239 @@
+"""Ende-til-ende benchmark av grafen og /prospects mot lokale leverandør-stubs.
+
+Krever ingen nøkler: Hunter, RapidAPI og OpenAI erstattes av stubs.py, og
+alle cacher skrus av slik at hver kjøring gjør de faktiske upstream-kallene.
+Rapporterer latens (p50/p95/p99), gjennomstrømning, upstream-kall per
+leverandør og statuskode, og høyeste minnebruk (tracemalloc).
+
+Eksempler (fra rotmappen):
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --mode api --runs 40 --concurrency 8
+    python benchmarks/bench_e2e.py --contacts 2000 --openai-latency lognormal:0.8:0.4 --error-rate 0.05
+    python benchmarks/bench_e2e.py --json resultat.json   # for sammenligning mellom endringer
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from stubs import ProviderStub, StubServer
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ende-til-ende benchmark mot lokale stubs")
+    parser.add_argument("--mode", choices=["invoke", "ainvoke", "api"], default="invoke",
+                        help="app.invoke i tråder, app.ainvoke, eller POST /prospects i prosess")
+    parser.add_argument("--runs", type=int, default=20, help="Antall kjøringer (domener)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Samtidige kjøringer")
+    parser.add_argument("--warmup", type=int, default=1, help="Kjøringer før måling starter")
+    parser.add_argument("--contacts", type=int, default=200, help="Kontakter per domene i Hunter-stuben")
+    parser.add_argument("--linkedin-ratio", type=float, default=0.8, help="Andel kontakter med LinkedIn-URL")
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--search-depth", type=int, default=1)
+    parser.add_argument("--target-role", default="ansvarlig for digital markedsføring")
+    parser.add_argument("--pipelined", action="store_true", help="Kjør grafen i pipelinet modus")
+    parser.add_argument("--prefetch-budget", type=int, default=0, help="LinkedIn-profiler som forhåndshentes under prioriteringen")
+    parser.add_argument("--hunter-latency", default="lognormal:0.15:0.3")
+    parser.add_argument("--rapidapi-latency", default="lognormal:0.4:0.4")
+    parser.add_argument("--openai-latency", default="lognormal:0.6:0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Feilrate for alle leverandører")
+    parser.add_argument("--error-status", type=int, default=503, help="Statuskode for injiserte feil")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Mål uten tracemalloc (lavere overhead)")
+    parser.add_argument("--json", help="Skriv rapporten som JSON til denne filen")
+    return parser.parse_args()
+
+def configure_environment(base_url: str, workdir: str) -> None:
+    """Peker alle leverandører mot stuben og skrur av cacher. Må skje før agent importeres."""
+    os.environ.update({
+        "HUNTER_BASE_URL": base_url,
+        "RAPIDAPI_BASE_URL": base_url,
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENAI_API_KEY": "stub",
+        "HUNTER_API_KEY": "stub",
+        "RAPIDAPI_KEY": "stub",
+        "LLM_CACHE_ENABLED": "false",
+        "LINKEDIN_CACHE_ENABLED": "false",
+        "HUNTER_CACHE_TTL": "0",
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.sqlite"),
+        "LANGCHAIN_TRACING_V2": "false",
+        "LANGSMITH_TRACING": "false"
+    })
+    os.environ.pop("CHECKPOINT_DB_PATH", None)
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def workflow_input(args, domain: str) -> dict:
+    return {
+        "messages": [],
+        "config": {
+            "domain": domain,
+            "target_role": args.target_role,
+            "max_results": args.max_results,
+            "search_depth": args.search_depth,
+            "pipelined": args.pipelined
+        },
+        "users": []
+    }
+
+def run_threads(args, domains: List[str]) -> List[dict]:
+    from agent import app
+
+    def one(domain: str) -> dict:
+        started = time.perf_counter()
+        try:
+            result = app.invoke(workflow_input(args, domain))
+            return {"latency": time.perf_counter() - started, "ok": True, "users": _analyzed(result["users"].values())}
+        except Exception as e:
+            return {"latency": time.perf_counter() - started, "ok": False, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(one, domains))
+
+async def run_async(args, domains: List[str]) -> List[dict]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    if args.mode == "api":
+        import httpx
+        from api import app as api_app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api_app), base_url="http://bench", timeout=None)
+
+        async def call(domain: str) -> int:
+            response = await client.post("/prospects", json={
+                "domain": domain,
+                "target_role": args.target_role,
+                "max_results": args.max_results,
+                "search_depth": args.search_depth,
+                "pipelined": args.pipelined
+            })
+            response.raise_for_status()
+            return len(response.json()["users"])
+    else:
+        from agent import app
+        client = None
+
+        async def call(domain: str) -> int:
+            result = await app.ainvoke(workflow_input(args, domain))
+            return _analyzed(result["users"].values())
+
+    async def one(domain: str) -> dict:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                users = await call(domain)
+                return {"latency": time.perf_counter() - started, "ok": True, "users": users}
+            except Exception as e:
+                return {"latency": time.perf_counter() - started, "ok": False, "error": str(e)}
+
+    try:
+        return await asyncio.gather(*(one(domain) for domain in domains))
+    finally:
+        if client is not None:
+            await client.aclose()
+
+def _analyzed(users) -> int:
+    return sum("linkedin_analyzed" in user.get("sources", []) for user in users)
+
+def measure(args, server: StubServer, runner: Callable[[List[str]], List[dict]], prefix: str, runs: int) -> Dict:
+    domains = [f"{prefix}{i}.example.no" for i in range(runs)]
+    server.reset_counts()
+    started = time.perf_counter()
+    results = runner(domains)
+    elapsed = time.perf_counter() - started
+    return {"results": results, "elapsed": elapsed, "upstream": server.counts()}
+
+def report(args, measured: Dict, peak_bytes: int) -> Dict:
+    results = measured["results"]
+    latencies = [r["latency"] for r in results if r["ok"]]
+    failures = [r for r in results if not r["ok"]]
+    runs = len(results)
+    upstream = {
+        name: {"total": sum(statuses.values()), "per_run": round(sum(statuses.values()) / runs, 2), "status": statuses}
+        for name, statuses in measured["upstream"].items()
+    }
+    return {
+        "mode": args.mode,
+        "runs": runs,
+        "concurrency": args.concurrency,
+        "contacts": args.contacts,
+        "failures": len(failures),
+        "first_error": failures[0]["error"] if failures else None,
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0
+        },
+        "throughput_runs_per_s": round(runs / measured["elapsed"], 3),
+        "wall_time_s": round(measured["elapsed"], 3),
+        "analyzed_users_per_run": round(sum(r.get("users", 0) for r in results if r["ok"]) / max(1, len(latencies)), 2),
+        "upstream": upstream,
+        "peak_memory_mb": round(peak_bytes / 1e6, 2) if peak_bytes else None
+    }
+
+def print_report(data: Dict) -> None:
+    print(f"\nModus: {data['mode']}  kjøringer: {data['runs']}  samtidighet: {data['concurrency']}  kontakter/domene: {data['contacts']}")
+    latency = data["latency_s"]
+    print(f"Latens (s):        p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  maks {latency['max']}")
+    print(f"Gjennomstrømning:  {data['throughput_runs_per_s']} kjøringer/s  ({data['wall_time_s']} s totalt)")
+    print(f"Feilede kjøringer: {data['failures']}" + (f"  (første: {data['first_error']})" if data["first_error"] else ""))
+    print(f"Analyserte brukere per kjøring: {data['analyzed_users_per_run']}")
+    print("Upstream-kall:")
+    for name, calls in data["upstream"].items():
+        print(f"  {name:<9} {calls['total']:>6} totalt  {calls['per_run']:>7} per kjøring  status {calls['status']}")
+    if data["peak_memory_mb"] is not None:
+        print(f"Høyeste minnebruk (tracemalloc): {data['peak_memory_mb']} MB")
+
+def main():
+    args = parse_args()
+    server = StubServer(
+        contacts=args.contacts,
+        linkedin_ratio=args.linkedin_ratio,
+        hunter=ProviderStub(args.hunter_latency, args.error_rate, args.error_status),
+        rapidapi=ProviderStub(args.rapidapi_latency, args.error_rate, args.error_status),
+        openai=ProviderStub(args.openai_latency, args.error_rate, args.error_status)
+    ).start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(server.base_url, workdir)
+        os.environ["LINKEDIN_PREFETCH_BUDGET"] = str(args.prefetch_budget)
+
+        if args.mode == "invoke":
+            runner = lambda domains: run_threads(args, domains)
+        else:
+            # Én event loop for hele målingen: klientene i SDK-ene er bundet til loopen
+            loop = asyncio.new_event_loop()
+            runner = lambda domains: loop.run_until_complete(run_async(args, domains))
+
+        if args.warmup:
+            measure(args, server, runner, "warmup", args.warmup)
+
+        if not args.no_tracemalloc:
+            tracemalloc.start()
+        measured = measure(args, server, runner, "bench", args.runs)
+        peak = 0
+        if not args.no_tracemalloc:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        data = report(args, measured, peak)
+        print_report(data)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+    server.stop()
+
+if __name__ == "__main__":
+    main()
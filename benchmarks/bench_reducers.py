@@ -0,0 +1,69 @@
+"""Mikrobenchmark: kostnad per merge i users-reduceren mot domenestørrelse.
+
+Sammenligner den gamle liste-baserte reduceren (bygger email->bruker-dict av
+hele listen og tilbake til liste for hver oppdatering) med den nøkkelbaserte
+reduceren i reducers.py.
+
+Kjør fra rotmappen:
+    python benchmarks/bench_reducers.py
+"""
+from typing import Dict, List
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from reducers import add_users
+
+def legacy_add_users(old_users: List[Dict], new_users: List[Dict]) -> List[Dict]:
+    """Reduceren slik den var i agent.py før nøkkelbasert state"""
+    email_to_user = {user['email']: user for user in old_users}
+    for new_user in new_users:
+        if new_user['email'] in email_to_user:
+            email_to_user[new_user['email']].update(new_user)
+        else:
+            email_to_user[new_user['email']] = new_user
+    return list(email_to_user.values())
+
+def make_user(i: int) -> Dict:
+    return {
+        "email": f"person{i}@example.com",
+        "first_name": "Ola",
+        "last_name": f"Nordmann{i}",
+        "role": "Markedssjef",
+        "confidence": "92",
+        "linkedin_url": f"https://linkedin.com/in/person{i}",
+        "phone_number": "",
+        "sources": ["hunter"],
+        "department": "marketing",
+        "seniority": "senior"
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,5000,20000", help="Domenestørrelser (antall brukere)")
+    parser.add_argument("--updated", type=int, default=3, help="Antall brukere som oppdateres per merge")
+    parser.add_argument("--repeat", type=int, default=200, help="Merges per måling")
+    args = parser.parse_args()
+
+    print(f"{'brukere':>8} {'liste (µs)':>12} {'nøkkel (µs)':>12} {'faktor':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        users = [make_user(i) for i in range(size)]
+        updates = [
+            {"email": users[i]["email"], "priority_score": 0.9, "sources": ["hunter", "prioritized"]}
+            for i in range(args.updated)
+        ]
+        old_list = list(users)
+        old_map = add_users({}, users)
+
+        legacy = timeit.timeit(lambda: legacy_add_users(old_list, updates), number=args.repeat)
+        keyed = timeit.timeit(lambda: add_users(old_map, updates), number=args.repeat)
+
+        legacy_us = legacy / args.repeat * 1e6
+        keyed_us = keyed / args.repeat * 1e6
+        print(f"{size:>8} {legacy_us:>12.1f} {keyed_us:>12.1f} {legacy_us / keyed_us:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
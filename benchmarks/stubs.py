@@ -0,0 +1,266 @@
+"""Lokale stand-ins for Hunter, RapidAPI (LinkedIn) og OpenAI for benchmarks.
+
+Én ThreadingHTTPServer (bare stdlib) svarer for alle tre leverandørene:
+    GET  /v2/domain-search        Hunter domain-search med paginering
+    GET  /get-linkedin-profile    RapidAPI fresh-linkedin-profile-data
+    POST /v1/chat/completions     OpenAI chat completions i json_mode
+    GET  /v1/models               OpenAI modelliste (brukes av oppvarming)
+
+Latens og feilrate settes per leverandør. Latens angis som en spesifikasjon:
+    fixed:0.1              alltid 100 ms
+    uniform:0.05:0.2       jevnt fordelt mellom 50 og 200 ms
+    lognormal:0.1:0.5      median 100 ms, sigma 0.5 (lang hale)
+    exp:0.1                eksponentielt fordelt, snitt 100 ms
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+
+ROLES = [
+    ("Chief Marketing Officer", "marketing", "executive"),
+    ("Digital Marketing Manager", "marketing", "senior"),
+    ("Head of Digital", "management", "executive"),
+    ("Software Developer", "it", "junior"),
+    ("Chief Financial Officer", "finance", "executive"),
+    ("Sales Representative", "sales", "junior"),
+    ("Content Marketing Specialist", "marketing", "junior"),
+    ("HR Manager", "hr", "senior"),
+    ("Product Manager", "management", "senior"),
+    (None, None, None)
+]
+
+def latency_sampler(spec: str) -> Callable[[], float]:
+    """Lager en funksjon som trekker en forsinkelse (sekunder) fra spesifikasjonen"""
+    kind, *args = spec.split(":")
+    values = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda: random.lognormvariate(mu, values[1]) if values[0] > 0 else 0.0
+    if kind == "exp":
+        return lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Ukjent latensfordeling: {spec}")
+
+class ProviderStub:
+    """Latens, feilrate og tellere for én leverandør"""
+
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0, error_status: int = 503):
+        self.sample = latency_sampler(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def respond(self) -> Optional[int]:
+        """Venter simulert latens. Returnerer en feilstatus eller None for suksess."""
+        time.sleep(self.sample())
+        status = self.error_status if random.random() < self.error_rate else 200
+        with self._lock:
+            self.calls[status] = self.calls.get(status, 0) + 1
+        return None if status == 200 else status
+
+    def total(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+class StubServer:
+    """Starter stub-serveren i en bakgrunnstråd"""
+
+    def __init__(self, contacts: int = 200, linkedin_ratio: float = 0.8,
+                 hunter: Optional[ProviderStub] = None,
+                 rapidapi: Optional[ProviderStub] = None,
+                 openai: Optional[ProviderStub] = None):
+        self.contacts = contacts
+        self.linkedin_ratio = linkedin_ratio
+        self.providers = {
+            "hunter": hunter or ProviderStub(),
+            "rapidapi": rapidapi or ProviderStub(),
+            "openai": openai or ProviderStub()
+        }
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "StubServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset_counts(self) -> None:
+        for provider in self.providers.values():
+            with provider._lock:
+                provider.calls.clear()
+
+    def counts(self) -> Dict[str, Dict[int, int]]:
+        return {name: dict(provider.calls) for name, provider in self.providers.items()}
+
+    # Svar
+
+    def hunter_page(self, domain: str, offset: int, limit: int) -> dict:
+        emails = [self._contact(domain, i) for i in range(offset, min(offset + limit, self.contacts))]
+        return {"data": {"domain": domain, "emails": emails}, "meta": {"results": self.contacts}}
+
+    def _contact(self, domain: str, i: int) -> dict:
+        position, department, seniority = ROLES[i % len(ROLES)]
+        rng = random.Random(f"{domain}-{i}")
+        has_linkedin = rng.random() < self.linkedin_ratio
+        return {
+            "value": f"person{i}@{domain}",
+            "first_name": f"Fornavn{i}",
+            "last_name": f"Etternavn{i}",
+            "position": position,
+            "department": department,
+            "seniority": seniority,
+            "confidence": rng.randint(40, 99),
+            "linkedin": f"https://www.linkedin.com/in/{domain.split('.')[0]}-person{i}" if has_linkedin else None,
+            "phone_number": None
+        }
+
+    def linkedin_profile(self, url: str) -> dict:
+        slug = url.rstrip("/").rsplit("/", 1)[-1]
+        rng = random.Random(slug)
+        start = 2024 - rng.randint(3, 25)
+        experiences = []
+        year = 2024
+        for n in range(rng.randint(3, 10)):
+            begin = max(start, year - rng.randint(1, 5))
+            experiences.append({
+                "title": rng.choice(["Markedssjef", "Digital leder", "Rådgiver", "Prosjektleder", "Konsulent"]),
+                "company": f"Selskap {rng.randint(1, 500)}",
+                "start_year": begin,
+                "end_year": None if n == 0 else year,
+                "is_current": n == 0,
+                "description": " ".join(["Ansvar for digital markedsføring, kampanjer og analyse."] * rng.randint(1, 4))
+            })
+            year = begin
+        return {"data": {
+            "about": "Erfaren leder innen digital markedsføring og merkevare. " * rng.randint(1, 5),
+            "experiences": experiences,
+            "educations": [{"school": "BI", "degree": rng.choice(["Bachelor", "Master"]), "field_of_study": "Markedsføring"}],
+            "languages": [{"name": "Norsk"}, {"name": "Engelsk"}],
+            "follower_count": rng.randint(50, 5000),
+            "connection_count": rng.randint(50, 500),
+            "location": "Oslo",
+            "company": experiences[0]["company"],
+            "job_title": experiences[0]["title"],
+            "current_company_start": f"{experiences[0]['start_year']}-01"
+        }}
+
+    def chat_completion(self, request: dict) -> dict:
+        prompt = request["messages"][-1]["content"]
+        content = self._completion_content(prompt)
+        text = json.dumps(content, ensure_ascii=False)
+        prompt_tokens = sum(len(m.get("content") or "") for m in request["messages"]) // 4
+        completion_tokens = len(text) // 4
+        return {
+            "id": "chatcmpl-" + hashlib.sha1(prompt.encode()).hexdigest()[:12],
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": text}
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def _completion_content(self, prompt: str) -> dict:
+        """Velger svar ut fra hvilken prompt i prompts.py som er brukt"""
+        if "Personer å vurdere" in prompt:
+            emails = re.findall(r'"email":\s*"([^"]+)"', prompt)
+            limit = re.search(r"Returner de (\d+)", prompt)
+            top = emails[:int(limit.group(1))] if limit else emails
+            return {"users": {
+                email: {"score": round(0.95 - 0.05 * n, 2), "reason": "Rollen matcher målrollen"}
+                for n, email in enumerate(top)
+            }}
+        if "Profiler å analysere" in prompt:
+            emails = re.findall(r'"([^"\s]+@[^"\s]+)":\{', prompt)
+            return {"profiles": {email: self._profile_analysis() for email in emails}}
+        return self._profile_analysis()
+
+    def _profile_analysis(self) -> dict:
+        return {
+            "summary": "Erfaren markedsleder med bred digital kompetanse.",
+            "key_skills": ["Digital markedsføring", "Ledelse", "Analyse"],
+            "leadership_experience": True,
+            "profile_type": "Leder",
+            "personality_traits": [{"trait": "Strategisk", "evidence": "Har bygget opp digitale team"}],
+            "career_pattern": {"trajectory": "Oppadgående", "changes": "Sjeldne jobbskifter", "focus": "Markedsføring"},
+            "education_pattern": {"focus": "Forretning", "progression": "Avsluttet", "relevance": "Høy"},
+            "fun_facts": []
+        }
+
+def _handler(stub: StubServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path.endswith("/domain-search"):
+                if self._fail("hunter"):
+                    return
+                self._send(stub.hunter_page(query["domain"], int(query.get("offset", 0)), int(query.get("limit", 10))))
+            elif url.path.endswith("/get-linkedin-profile"):
+                if self._fail("rapidapi"):
+                    return
+                self._send(stub.linkedin_profile(query["linkedin_url"]))
+            elif url.path.endswith("/models"):
+                self._send({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "stub"}]})
+            else:
+                self._send({"error": "not found"}, 404)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.path.endswith("/chat/completions"):
+                return self._send({"error": "not found"}, 404)
+            if self._fail("openai"):
+                return
+            self._send(stub.chat_completion(json.loads(body)))
+
+        def _fail(self, provider: str) -> bool:
+            status = stub.providers[provider].respond()
+            if status is None:
+                return False
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            self._send({"error": {"message": f"stub error {status}", "type": "stub"}}, status, headers)
+            return True
+
+        def _send(self, payload: dict, status: int = 200, headers: Optional[Dict[str, str]] = None):
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
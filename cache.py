@@ -0,0 +1,212 @@
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from metrics import record_cache
+
+# Felles cache-fil for alle persistente cacher. Hver cache har sitt eget namespace.
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache.sqlite")
+
+def content_key(*parts: Any) -> str:
+    """Stabil innholdsadressert nøkkel (sha256) for JSON-serialiserbare deler"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CacheEntry(NamedTuple):
+    value: Any
+    negative: bool  # True når oppslaget tidligere ga "ikke funnet"
+    stored_at: float
+
+class SQLiteTTLCache:
+    """Persistent nøkkel/verdi-cache i SQLite med TTL, negativ cache og LRU-utkasting"""
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        max_entries: int,
+        negative_ttl: Optional[float] = None,
+        path: Optional[str] = None
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self.path = path or CACHE_DB_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "negative_hits": 0, "evictions": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        # Åpnes først ved første bruk, slik at import ikke lager filer
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT,
+                    negative INTEGER NOT NULL DEFAULT 0,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Returnerer gyldig oppføring eller None ved miss/utløpt"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, negative, stored_at, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None or row[3] <= now:
+                self._stats["misses"] += 1
+                record_cache(self.namespace, "miss")
+                return None
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            if row[1]:
+                self._stats["negative_hits"] += 1
+                record_cache(self.namespace, "negative_hit")
+                return CacheEntry(None, True, row[2])
+            self._stats["hits"] += 1
+            record_cache(self.namespace, "hit")
+            return CacheEntry(json.loads(row[0]), False, row[2])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._put(key, json.dumps(value), False, ttl if ttl is not None else self.ttl)
+
+    def set_negative(self, key: str, ttl: Optional[float] = None) -> None:
+        """Lagrer at nøkkelen ikke finnes hos leverandøren"""
+        self._put(key, None, True, ttl if ttl is not None else self.negative_ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            )
+
+    def _put(self, key: str, value: Optional[str], negative: bool, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, value, int(negative), now, now + ttl, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Fjerner utløpte oppføringer og de minst brukte over max_entries"""
+        size = conn.execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        if size <= self.max_entries:
+            return
+        removed = conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, now)
+        ).rowcount
+        overflow = size - removed - self.max_entries
+        if overflow > 0:
+            removed += conn.execute("""
+                DELETE FROM cache WHERE namespace = ? AND key IN (
+                    SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at LIMIT ?
+                )
+            """, (self.namespace, self.namespace, overflow)).rowcount
+        self._stats["evictions"] += removed
+
+    def stats(self) -> Dict[str, int]:
+        """Treff/bom-tellere for denne prosessen"""
+        with self._lock:
+            return dict(self._stats)
+
+class StaleWhileRevalidateCache:
+    """Minnecache med TTL der utløpte verdier serveres mens de fornyes i bakgrunnen
+
+    Oppføringer yngre enn ttl er "fresh". Mellom ttl og stale_ttl er de "stale":
+    de serveres fortsatt, men kalleren bør starte refresh(). Eldre enn stale_ttl
+    regnes som "miss".
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int, name: str = "memory"):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def get(self, key: str) -> Tuple[Optional[Any], str]:
+        """Returnerer (verdi, status) der status er 'fresh', 'stale' eller 'miss'"""
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.time() - entry[0] if entry else None
+            if entry is None or age >= self.stale_ttl:
+                self._stats["misses"] += 1
+                record_cache(self.name, "miss")
+                return None, "miss"
+            self._entries.move_to_end(key)
+            if age < self.ttl:
+                self._stats["hits"] += 1
+                record_cache(self.name, "hit")
+                return entry[1], "fresh"
+            self._stats["stale_hits"] += 1
+            record_cache(self.name, "stale_hit")
+            return entry[1], "stale"
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key: str, loader: Callable[[], Optional[Any]]) -> bool:
+        """Fornyer nøkkelen i en bakgrunnstråd. Kun én fornyelse per nøkkel om gangen.
+
+        Loaderen returnerer ny verdi, eller None hvis resultatet ikke skal lagres.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self._stats["refreshes"] += 1
+
+        def run():
+            try:
+                value = loader()
+                if value is not None:
+                    self.set(key, value)
+            except Exception:
+                with self._lock:
+                    self._stats["refresh_errors"] += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+        return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,141 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+from collections import Counter
+from datetime import date
+import json
+import math
+import os
+from ranking import tokenize
+from tokens import estimate_tokens
+
+# Deterministisk komprimering av LinkedIn-profiler før LLM-analysen. Profilen
+# serialiseres kompakt, bare feltene prompten trenger beholdes, og eldre eller
+# irrelevante erfaringer kuttes til profilen holder seg innenfor et token-budsjett.
+
+LINKEDIN_PROFILE_TOKENS = int(os.getenv("LINKEDIN_PROFILE_TOKENS", "1200"))  # Token-budsjett per profil
+LINKEDIN_MAX_EXPERIENCES = int(os.getenv("LINKEDIN_MAX_EXPERIENCES", "8"))  # Maks erfaringer før budsjettet vurderes
+DESCRIPTION_CHARS = 300  # Maks tegn per stillingsbeskrivelse
+SHORT_DESCRIPTION_CHARS = 100  # Når budsjettet er sprengt
+ABOUT_CHARS = 600  # Maks tegn i "about"
+SHORT_ABOUT_CHARS = 200
+RECENCY_HALF_LIFE = 5.0  # År før en erfaring teller halvparten så mye
+RECENCY_WEIGHT = 0.5
+RELEVANCE_WEIGHT = 0.5
+
+PROFILE_FIELDS = ("job_title", "company", "current_company_start", "location", "follower_count", "connection_count")
+EXPERIENCE_FIELDS = ("title", "company", "start_year", "start_month", "end_year", "end_month", "is_current", "duration")
+EDUCATION_FIELDS = ("school", "degree", "field_of_study", "start_year", "end_year")
+
+class CondensedProfile(NamedTuple):
+    text: str  # Kompakt JSON som sendes til LLM
+    original_tokens: int  # Estimat for den fulle profilen (json med indent=2)
+    tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+def condense_profile(profile: Dict[str, Any], target_role: str, budget: int = LINKEDIN_PROFILE_TOKENS) -> CondensedProfile:
+    """Komprimerer en LinkedIn-profil for målrollen innenfor budsjettet (estimerte tokens).
+
+    Nåværende stillinger, utdanning og nettverkstall beholdes alltid. Når
+    erfaringer kuttes, oppgis antall og tidligste startår slik at total
+    erfaring fortsatt kan beregnes.
+    """
+    original_tokens = estimate_tokens(json.dumps(profile, indent=2))
+    experiences = [e for e in profile.get("experiences") or [] if isinstance(e, dict)]
+    ranked = _rank_experiences(experiences, target_role)
+
+    kept = [e for e in ranked if e.get("is_current")]
+    kept += [e for e in ranked if not e.get("is_current")][:max(0, LINKEDIN_MAX_EXPERIENCES - len(kept))]
+    description_chars, about_chars = DESCRIPTION_CHARS, ABOUT_CHARS
+
+    condensed = _build(profile, experiences, kept, description_chars, about_chars)
+    while estimate_tokens(condensed) > budget:
+        droppable = [e for e in kept if not e.get("is_current")]
+        if droppable:
+            # Den lavest rangerte erfaringen går først
+            kept.remove(droppable[-1])
+        elif description_chars > SHORT_DESCRIPTION_CHARS:
+            description_chars = SHORT_DESCRIPTION_CHARS
+        elif about_chars > SHORT_ABOUT_CHARS:
+            about_chars = SHORT_ABOUT_CHARS
+        elif description_chars:
+            description_chars = 0
+        elif about_chars:
+            about_chars = 0
+        else:
+            break
+        condensed = _build(profile, experiences, kept, description_chars, about_chars)
+
+    return CondensedProfile(condensed, original_tokens, estimate_tokens(condensed))
+
+def _rank_experiences(experiences: List[Dict], target_role: str) -> List[Dict]:
+    """Sorterer erfaringer etter nylighet og likhet med målrollen, best først"""
+    role_vector = Counter(tokenize(target_role))
+    this_year = date.today().year
+
+    def score(experience: Dict) -> float:
+        age = max(0, this_year - _end_year(experience, this_year))
+        recency = 0.5 ** (age / RECENCY_HALF_LIFE)
+        text = f"{experience.get('title') or ''} {experience.get('description') or ''}"
+        relevance = _cosine(role_vector, Counter(tokenize(text)))
+        return RECENCY_WEIGHT * recency + RELEVANCE_WEIGHT * relevance
+
+    return sorted(experiences, key=score, reverse=True)
+
+def _build(profile: Dict, experiences: List[Dict], kept: List[Dict], description_chars: int, about_chars: int) -> str:
+    condensed: Dict[str, Any] = {}
+    about = _truncate(profile.get("about"), about_chars)
+    if about:
+        condensed["about"] = about
+    condensed.update(_pick(profile, PROFILE_FIELDS))
+
+    # Behold opprinnelig (kronologisk) rekkefølge på erfaringene som er med
+    condensed["experiences"] = [
+        _experience(e, description_chars) for e in experiences if any(e is k for k in kept)
+    ]
+    omitted = [e for e in experiences if not any(e is k for k in kept)]
+    if omitted:
+        start_years = [e["start_year"] for e in experiences if isinstance(e.get("start_year"), int)]
+        condensed["omitted_experiences"] = {
+            "count": len(omitted),
+            "earliest_start_year": min(start_years) if start_years else None
+        }
+
+    educations = [_pick(e, EDUCATION_FIELDS) for e in profile.get("educations") or [] if isinstance(e, dict)]
+    if educations:
+        condensed["educations"] = educations
+    languages = [l.get("name") for l in profile.get("languages") or [] if isinstance(l, dict) and l.get("name")]
+    if languages:
+        condensed["languages"] = languages
+    return json.dumps(condensed, ensure_ascii=False, separators=(",", ":"))
+
+def _experience(experience: Dict, description_chars: int) -> Dict:
+    compact = _pick(experience, EXPERIENCE_FIELDS)
+    description = _truncate(experience.get("description"), description_chars)
+    if description:
+        compact["description"] = description
+    return compact
+
+def _pick(source: Dict, fields: tuple) -> Dict:
+    """Bare feltene som er satt, uten tomme verdier"""
+    return {f: source[f] for f in fields if source.get(f) not in (None, "", [], {})}
+
+def _truncate(text: Optional[str], chars: int) -> Optional[str]:
+    if not text or chars <= 0:
+        return None
+    text = " ".join(text.split())
+    return text if len(text) <= chars else text[:chars].rsplit(" ", 1)[0] + "…"
+
+def _end_year(experience: Dict, this_year: int) -> int:
+    if experience.get("is_current"):
+        return this_year
+    for field in ("end_year", "start_year"):
+        if isinstance(experience.get(field), int):
+            return experience[field]
+    return 0
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b[token] for token, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
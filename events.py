@@ -0,0 +1,44 @@
+from collections import deque
+from typing import Any, Dict, List, Optional
+import os
+import threading
+import time
+
+# Ringbuffer for detaljerte hendelser (ett innslag per verktøykall/melding).
+# Brukes når meldingsloggen i state er kompakt, slik at detaljene finnes for
+# feilsøking uten at state, traces og checkpoints vokser med domenestørrelsen.
+EVENT_LOG_SIZE = int(os.getenv("EVENT_LOG_SIZE", "1000"))  # Antall hendelser som beholdes i minnet
+
+class EventLog:
+    """Trådsikker ringbuffer med fast maksstørrelse"""
+
+    def __init__(self, maxlen: int = EVENT_LOG_SIZE):
+        self._events: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._recorded = 0
+
+    def record(self, kind: str, **fields: Any) -> None:
+        event = {"ts": time.time(), "kind": kind, **fields}
+        with self._lock:
+            self._events.append(event)
+            self._recorded += 1
+
+    def recent(self, limit: Optional[int] = None, **where: Any) -> List[Dict[str, Any]]:
+        """De siste hendelsene, eldste først. where filtrerer på felter, f.eks. domain=..."""
+        with self._lock:
+            events = list(self._events)
+        where = {k: v for k, v in where.items() if v is not None}
+        if where:
+            events = [e for e in events if all(e.get(k) == v for k, v in where.items())]
+        return events[-limit:] if limit else events
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._events),
+                "max_size": self._events.maxlen,
+                "recorded": self._recorded,
+                "dropped": self._recorded - len(self._events)
+            }
+
+event_log = EventLog()
@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date
+import math
+import re
+
+# Objektive felter som leses rett ut av LinkedIn-profilen i stedet for å
+# genereres av LLM-en. Deterministisk, slik at samme profil alltid gir samme svar.
+
+# Utdanningsnivåer fra høyest til lavest, med mønstre som matcher grad/studie
+EDUCATION_LEVELS = [
+    ("PhD", r"\bph\.?\s?d\b|\bdoktor|\bdoctor|\bdr\.\s?(philos|scient)"),
+    ("Master", r"\bmaster|\bm\.?\s?sc\b|\bm\.?\s?a\b|\bmba\b|\bcand\.|\bsiviløkonom|\bsivilingeni|\bmagister"),
+    ("Bachelor", r"\bbachelor|\bb\.?\s?sc\b|\bb\.?\s?a\b|\bbba\b|\bhøgskolekandidat|\bøkonom\b"),
+    ("Videregående", r"\bvideregående|\bhigh school|\bvgs\b|\bgymnas|\bfagbrev")
+]
+UNKNOWN_EDUCATION = "Ukjent"
+
+# Feltene extract_features() fyller ut
+FEATURE_FIELDS = ("experience_years", "current_company_years", "education_level", "network_strength")
+
+# Terskler for engasjement ut fra antall følgere
+ENGAGEMENT_LEVELS = [(5000, "Høy"), (500, "Medium"), (0, "Lav")]
+
+def extract_features(profile: Dict[str, Any], today: Optional[date] = None) -> Dict[str, Any]:
+    """Beregner experience_years, current_company_years, education_level og network_strength"""
+    today = today or date.today()
+    return {
+        "experience_years": experience_years(profile.get("experiences") or [], today),
+        "current_company_years": current_company_years(profile, today),
+        "education_level": education_level(profile.get("educations") or []),
+        "network_strength": network_strength(profile)
+    }
+
+def experience_years(experiences: List[Dict], today: date) -> int:
+    """Hele år med arbeidserfaring. Overlappende stillinger telles bare én gang."""
+    intervals = sorted(
+        interval for interval in (_interval(e, today) for e in experiences if isinstance(e, dict))
+        if interval is not None
+    )
+    months = 0
+    current_start, current_end = None, None
+    for start, end in intervals:
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                months += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        months += current_end - current_start
+    return months // 12
+
+def current_company_years(profile: Dict[str, Any], today: date) -> Optional[float]:
+    """År i nåværende bedrift, rundet til nærmeste halve år"""
+    start = _parse_month(profile.get("current_company_start"))
+    if start is None:
+        current = [e for e in profile.get("experiences") or [] if isinstance(e, dict) and e.get("is_current")]
+        starts = [s for s in (_month_index(e.get("start_year"), e.get("start_month")) for e in current) if s is not None]
+        start = min(starts) if starts else None
+    if start is None:
+        return None
+    months = max(0, _month_index(today.year, today.month) - start)
+    return math.floor(months / 6 + 0.5) / 2  # Halve opp, ikke bankers avrunding
+
+def education_level(educations: List[Dict]) -> str:
+    """Høyeste utdanningsnivå: 'PhD', 'Master', 'Bachelor', 'Videregående' eller 'Ukjent'"""
+    text = " ".join(
+        f"{e.get('degree') or ''} {e.get('field_of_study') or ''}"
+        for e in educations if isinstance(e, dict)
+    ).lower()
+    for level, pattern in EDUCATION_LEVELS:
+        if re.search(pattern, text):
+            return level
+    return UNKNOWN_EDUCATION
+
+def network_strength(profile: Dict[str, Any]) -> Dict[str, Any]:
+    followers = profile.get("follower_count") or 0
+    connections = profile.get("connection_count") or 0
+    engagement = next(label for threshold, label in ENGAGEMENT_LEVELS if followers >= threshold)
+    return {"followers": followers, "connections": connections, "engagement": engagement}
+
+def _interval(experience: Dict, today: date) -> Optional[Tuple[int, int]]:
+    """(start, slutt) som månedsindekser, eller None uten startår"""
+    start = _month_index(experience.get("start_year"), experience.get("start_month"))
+    if start is None:
+        return None
+    end = _month_index(experience.get("end_year"), experience.get("end_month") or 12)
+    if experience.get("is_current") or (end is None and experience.get("is_current") is not False):
+        end = _month_index(today.year, today.month)
+    elif end is None:
+        end = start
+    return start, max(start, end)
+
+def _month_index(year: Any, month: Any = None) -> Optional[int]:
+    try:
+        year = int(year)
+    except (TypeError, ValueError):
+        return None
+    try:
+        month = min(12, max(1, int(month)))
+    except (TypeError, ValueError):
+        month = 1
+    return year * 12 + month - 1
+
+def _parse_month(value: Any) -> Optional[int]:
+    """Tolker 'YYYY-MM', 'YYYY' eller {'year': ..., 'month': ...}"""
+    if isinstance(value, dict):
+        return _month_index(value.get("year"), value.get("month"))
+    match = re.match(r"^\s*(\d{4})(?:-(\d{1,2}))?", str(value or ""))
+    return _month_index(match.group(1), match.group(2)) if match else None
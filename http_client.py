@@ -0,0 +1,190 @@
+from typing import Optional
+from urllib.parse import urlsplit
+import asyncio
+import os
+import random
+import time
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from limits import provider_slot, aprovider_slot, rate_limiter, retry_after, check_wait, RATE_LIMIT_MAX_RETRIES
+from metrics import record_retry, record_upstream
+
+# Delt HTTP-klientlag for verktøyene. Alle kall til Hunter og RapidAPI går via
+# én pool per prosess (sync) og én pool per event loop (async), slik at
+# TCP+TLS-oppkoblinger gjenbrukes mellom kall.
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))  # Sekunder for lesing
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # Sekunder for oppkobling
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))  # Sekunder, dobles per forsøk
+HTTP_BACKOFF_MAX = 8.0
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+HTTP_MAX_HOSTS = 10
+RETRY_STATUSES = {500, 502, 503, 504}
+
+_session: Optional[requests.Session] = None
+_sync_client: Optional[httpx.Client] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_host_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+def backoff_delay(attempt: int) -> float:
+    """Eksponentiell backoff med full jitter"""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+def rate_limited_delay(provider: Optional[str], rate_key: Optional[str], headers, attempt: int) -> float:
+    """Ventetid før nytt forsøk etter 429.
+
+    Med rate-bøtte venter acquire() på Retry-After. Er grensen skrudd av (0),
+    finnes ingen bøtte, og vi venter her på Retry-After eller backoff.
+    """
+    if rate_limiter.bucket(provider, rate_key) is not None:
+        return 0.0
+    wait = retry_after(headers)
+    if wait is None:
+        wait = backoff_delay(attempt)
+    check_wait(provider, wait)
+    return wait
+
+def get_session() -> requests.Session:
+    """Returnerer den delte sessionen med keep-alive og begrenset pool per host"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_MAX_HOSTS,
+            pool_maxsize=HTTP_MAX_CONNECTIONS_PER_HOST,
+            pool_block=True,  # Vent på ledig kobling i stedet for å åpne flere
+            max_retries=0  # Retry håndteres i request() under
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+def request(method: str, url: str, provider: Optional[str] = None, rate_key: Optional[str] = None, **kwargs) -> requests.Response:
+    """Sync HTTP-kall med timeout, rate-grense og retry på 429, 5xx og brutte koblinger.
+
+    provider ('hunter', 'rapidapi') styrer hvilken prosessglobal samtidighetsgrense
+    og rate-grense kallet teller mot, og rate_key (API-nøkkelen) velger bøtte
+    innenfor leverandøren. Ved 429 venter neste forsøk til leverandøren åpner
+    igjen (Retry-After). Må kallet vente lenger enn RATE_LIMIT_MAX_WAIT, feiler
+    det med RateLimitExceeded. Siste respons returneres uansett status; kalleren
+    bruker raise_for_status().
+    """
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT))
+    session = get_session()
+    retries = rate_limited = 0
+    with provider_slot(provider):
+        while True:
+            rate_limiter.acquire(provider, rate_key)
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.ConnectionError:
+                record_upstream(provider, "error", time.perf_counter() - started)
+                if retries >= HTTP_MAX_RETRIES:
+                    raise
+                record_retry(provider, "connection")
+                time.sleep(backoff_delay(retries))
+                retries += 1
+                continue
+            record_upstream(provider, response.status_code, time.perf_counter() - started)
+            rate_limiter.observe(provider, rate_key, response.status_code, response.headers)
+            if response.status_code == 429 and rate_limited < RATE_LIMIT_MAX_RETRIES:
+                response.close()
+                record_retry(provider, 429)
+                time.sleep(rate_limited_delay(provider, rate_key, response.headers, rate_limited))
+                rate_limited += 1
+                continue
+            if response.status_code in RETRY_STATUSES and retries < HTTP_MAX_RETRIES:
+                response.close()
+                record_retry(provider, response.status_code)
+                time.sleep(backoff_delay(retries))
+                retries += 1
+                continue
+            return response
+
+def get(url: str, provider: Optional[str] = None, rate_key: Optional[str] = None, **kwargs) -> requests.Response:
+    return request("GET", url, provider=provider, rate_key=rate_key, **kwargs)
+
+def _httpx_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST * HTTP_MAX_HOSTS,
+        max_keepalive_connections=HTTP_MAX_CONNECTIONS_PER_HOST * HTTP_MAX_HOSTS
+    )
+
+def get_sync_client() -> httpx.Client:
+    """Delt sync httpx-klient for SDK-er som krever httpx (OpenAI)"""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=_httpx_limits()
+        )
+    return _sync_client
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returnerer den delte async-klienten for gjeldende event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=_httpx_limits()
+        )
+        _async_clients[loop] = client
+    return client
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    """Begrenser antall samtidige koblinger per host i async-klienten"""
+    semaphores = _host_semaphores.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+    return semaphores[host]
+
+async def arequest(method: str, url: str, provider: Optional[str] = None, rate_key: Optional[str] = None, **kwargs) -> httpx.Response:
+    """Async variant av request() som deler pool innenfor event loopen"""
+    client = get_async_client()
+    if kwargs.get("headers"):
+        # requests dropper headere med None-verdi, httpx avviser dem
+        kwargs["headers"] = {k: v for k, v in kwargs["headers"].items() if v is not None}
+    retries = rate_limited = 0
+    async with aprovider_slot(provider), _host_semaphore(url):
+        while True:
+            await rate_limiter.aacquire(provider, rate_key)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError):
+                record_upstream(provider, "error", time.perf_counter() - started)
+                if retries >= HTTP_MAX_RETRIES:
+                    raise
+                record_retry(provider, "connection")
+                await asyncio.sleep(backoff_delay(retries))
+                retries += 1
+                continue
+            record_upstream(provider, response.status_code, time.perf_counter() - started)
+            rate_limiter.observe(provider, rate_key, response.status_code, response.headers)
+            if response.status_code == 429 and rate_limited < RATE_LIMIT_MAX_RETRIES:
+                record_retry(provider, 429)
+                await asyncio.sleep(rate_limited_delay(provider, rate_key, response.headers, rate_limited))
+                rate_limited += 1
+                continue
+            if response.status_code in RETRY_STATUSES and retries < HTTP_MAX_RETRIES:
+                record_retry(provider, response.status_code)
+                await asyncio.sleep(backoff_delay(retries))
+                retries += 1
+                continue
+            return response
+
+async def aget(url: str, provider: Optional[str] = None, rate_key: Optional[str] = None, **kwargs) -> httpx.Response:
+    return await arequest("GET", url, provider=provider, rate_key=rate_key, **kwargs)
+
+async def aclose() -> None:
+    """Lukker async-klienten for gjeldende event loop"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,104 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from collections import OrderedDict
+import asyncio
+import os
+import time
+import uuid
+
+# Batch-jobber: mange (domene, målrolle)-par kjøres av en delt pool av async
+# workers i API-prosessen. Leverandørgrensene i limits.py gjelder på tvers av
+# alle workers, så gjennomstrømningen skalerer med antall workers uten at vi
+# overskrider det leverandørene tåler.
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+BATCH_MAX_RETAINED_JOBS = int(os.getenv("BATCH_MAX_RETAINED_JOBS", "100"))
+
+class BatchJob:
+    """En batch-jobb med status og delresultater per element"""
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.items = items
+        self.results: List[Dict[str, Any]] = [
+            {"status": "queued", **item} for item in items
+        ]
+
+    @property
+    def status(self) -> str:
+        statuses = {r["status"] for r in self.results}
+        if statuses <= {"completed", "failed"}:
+            return "completed"
+        if statuses == {"queued"}:
+            return "queued"
+        return "running"
+
+    def progress(self) -> Dict[str, int]:
+        counts = {"total": len(self.results), "queued": 0, "running": 0, "completed": 0, "failed": 0}
+        for result in self.results:
+            counts[result["status"]] += 1
+        return counts
+
+class JobManager:
+    """Kjører batch-jobber med en delt pool av async workers"""
+
+    def __init__(self, run_item: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]], workers: int = BATCH_WORKERS):
+        self.run_item = run_item
+        self.workers = workers
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, items: List[Dict[str, Any]]) -> BatchJob:
+        """Legger jobben i køen og returnerer den umiddelbart"""
+        self._ensure_workers()
+        job = BatchJob(items)
+        self._jobs[job.id] = job
+        self._prune()
+        for index in range(len(items)):
+            self._queue.put_nowait((job, index))
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self._jobs.get(job_id)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def _ensure_workers(self) -> None:
+        # Startes ved første jobb, inne i event loopen til API-et
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"batch-worker-{i}")
+                for i in range(self.workers)
+            ]
+
+    async def _worker(self) -> None:
+        while True:
+            job, index = await self._queue.get()
+            result = job.results[index]
+            result["status"] = "running"
+            try:
+                result.update(await self.run_item(job.items[index]))
+                result["status"] = "completed"
+            except Exception as e:
+                result["status"] = "failed"
+                result["error"] = str(e)
+            finally:
+                if job.status == "completed" and job.finished_at is None:
+                    job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        """Glemmer de eldste ferdige jobbene utover BATCH_MAX_RETAINED_JOBS"""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= BATCH_MAX_RETAINED_JOBS:
+                break
+            if self._jobs[job_id].status == "completed":
+                del self._jobs[job_id]
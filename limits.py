@@ -0,0 +1,256 @@
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import weakref
+
+# Grenser for samtidige kall per leverandør. Grensen gjelder per modus: sync-kall
+# deler én pool per prosess (trådene), og async-kall deler én pool per event
+# loop. I API-et kjører alle forespørsler og batch-jobber på serverens loop, og
+# Hunter-cachens bakgrunnsfornyelse sendes dit, så antall workers multipliserer
+# ikke trykket mot Hunter, RapidAPI og OpenAI. En prosess som blander
+# app.invoke og app.ainvoke kan derimot få opptil dobbel samtidighet.
+PROVIDER_CONCURRENCY = {
+    "hunter": int(os.getenv("HUNTER_MAX_CONCURRENT", "5")),
+    "rapidapi": int(os.getenv("RAPIDAPI_MAX_CONCURRENT", "5")),
+    "openai": int(os.getenv("OPENAI_MAX_CONCURRENT", "10"))
+}
+
+_thread_semaphores: Dict[str, threading.BoundedSemaphore] = {
+    provider: threading.BoundedSemaphore(limit) for provider, limit in PROVIDER_CONCURRENCY.items()
+}
+_async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+@contextmanager
+def provider_slot(provider: str):
+    """Holder en av leverandørens plasser under et sync-kall"""
+    semaphore = _thread_semaphores.get(provider)
+    if semaphore is None:
+        yield
+        return
+    with semaphore:
+        yield
+
+@asynccontextmanager
+async def aprovider_slot(provider: str):
+    """Async variant av provider_slot(), én pool per event loop"""
+    if provider not in PROVIDER_CONCURRENCY:
+        yield
+        return
+    semaphores = _async_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if provider not in semaphores:
+        semaphores[provider] = asyncio.Semaphore(PROVIDER_CONCURRENCY[provider])
+    async with semaphores[provider]:
+        yield
+
+def provider_busy(provider: str) -> bool:
+    """Sant når alle leverandørens plasser er i bruk. Brukes for å droppe
+    spekulative kall som ellers ville stått i kø foran ekte kall."""
+    try:
+        semaphore = _async_semaphores.get(asyncio.get_running_loop(), {}).get(provider)
+        return semaphore is not None and semaphore.locked()
+    except RuntimeError:
+        pass
+    semaphore = _thread_semaphores.get(provider)
+    if semaphore is None or semaphore.acquire(blocking=False) is False:
+        return semaphore is not None
+    semaphore.release()
+    return False
+
+# Prosessglobale rate-grenser (forespørsler per sekund) per leverandør og
+# API-nøkkel. Bøttene deles av alle kjøringer og tilpasses når leverandøren
+# svarer 429 eller melder at kvoten er brukt opp. 0 skrur av begrensningen.
+PROVIDER_RATE_LIMITS = {
+    "hunter": float(os.getenv("HUNTER_RATE_LIMIT", "15")),
+    "rapidapi": float(os.getenv("RAPIDAPI_RATE_LIMIT", "0")),
+    "openai": float(os.getenv("OPENAI_RATE_LIMIT", "50"))
+}
+RATE_LIMIT_OVERRIDES = json.loads(os.getenv("RATE_LIMIT_OVERRIDES", "{}"))  # {"<api-nøkkel>": forespørsler per sekund}
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))  # Nye forsøk etter 429
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))  # Sekunder et kall kan vente på rate-grensen før det feiler
+RATE_LIMIT_MIN_FRACTION = 0.05  # Laveste rate etter gjentatte 429, som andel av grensen
+RATE_LIMIT_RECOVERY = 0.05  # Andel av grensen raten øker med per vellykket kall
+
+_RESET_HEADERS = ("retry-after-ms", "retry-after", "x-ratelimit-reset", "x-ratelimit-reset-requests",
+                  "x-ratelimit-requests-reset", "ratelimit-reset")
+_REMAINING_HEADERS = ("x-ratelimit-remaining", "x-ratelimit-remaining-requests",
+                      "x-ratelimit-requests-remaining", "ratelimit-remaining")
+
+class RateLimitExceeded(Exception):
+    """Leverandøren tar ikke imot kall innen RATE_LIMIT_MAX_WAIT"""
+
+def check_wait(provider: Optional[str], wait: float) -> None:
+    """Feiler i stedet for å sove lenger enn RATE_LIMIT_MAX_WAIT med leverandørplassen holdt"""
+    if wait > RATE_LIMIT_MAX_WAIT:
+        raise RateLimitExceeded(
+            f"{provider} rate limit: next request allowed in {wait:.0f}s (max wait {RATE_LIMIT_MAX_WAIT:.0f}s)"
+        )
+
+class AdaptiveTokenBucket:
+    """Token bucket der raten halveres ved 429 og øker gradvis igjen (AIMD)
+
+    reserve() trekker en token og returnerer hvor lenge kalleren må vente. Tokens
+    kan gå i minus, slik at ventende kall får hver sin tur i stedet for å kappes.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.limit = rate
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.decreased_at = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float = float("inf")) -> float:
+        """Overstiger ventetiden max_wait, trekkes ingen token"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max((1 - self.tokens) / self.rate if self.tokens < 1 else 0.0, self.blocked_until - now)
+            if wait <= max_wait:
+                self.tokens -= 1
+            return wait
+
+    def rate_limited(self, retry_after: Optional[float]) -> None:
+        """429: halver raten og vent til leverandøren åpner igjen.
+
+        Samtidige kall som får 429 fra samme topp halverer bare én gang.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and now - self.decreased_at >= 1.0:
+                self.rate = max(self.limit * RATE_LIMIT_MIN_FRACTION, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+                self.decreased_at = now
+            self.blocked_until = max(self.blocked_until, now + (retry_after if retry_after is not None else 1 / self.rate))
+
+    def exhausted(self, reset_in: float) -> None:
+        """Kvoten er brukt opp (remaining = 0): vent til den nullstilles.
+
+        Lengre vinduer enn RATE_LIMIT_MAX_WAIT er plan-kvoter (RapidAPI oppgir
+        månedskvoten), ikke en takt. Dem overlater vi til leverandøren, som
+        svarer 429 eller fakturerer overforbruk.
+        """
+        if reset_in > RATE_LIMIT_MAX_WAIT:
+            return
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset_in)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            if self.rate < self.limit:
+                self.rate = min(self.limit, self.rate + self.limit * RATE_LIMIT_RECOVERY)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class RateLimiter:
+    """Én tilpasningsdyktig token bucket per (leverandør, API-nøkkel)"""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, str], AdaptiveTokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, provider: Optional[str], api_key: Optional[str] = None) -> Optional[AdaptiveTokenBucket]:
+        rate = RATE_LIMIT_OVERRIDES.get(api_key) if api_key else None
+        if rate is None:
+            rate = PROVIDER_RATE_LIMITS.get(provider or "", 0)
+        if not rate:
+            return None
+        # Nøkkelen hashes slik at den ikke ligger i klartekst i registeret
+        key = (provider, hashlib.sha256((api_key or "").encode()).hexdigest()[:16])
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = AdaptiveTokenBucket(float(rate))
+            return self._buckets[key]
+
+    def acquire(self, provider: Optional[str], api_key: Optional[str] = None) -> None:
+        bucket = self.bucket(provider, api_key)
+        if bucket is not None:
+            wait = bucket.reserve(RATE_LIMIT_MAX_WAIT)
+            check_wait(provider, wait)
+            if wait > 0:
+                time.sleep(wait)
+
+    async def aacquire(self, provider: Optional[str], api_key: Optional[str] = None) -> None:
+        bucket = self.bucket(provider, api_key)
+        if bucket is not None:
+            wait = bucket.reserve(RATE_LIMIT_MAX_WAIT)
+            check_wait(provider, wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    def observe(self, provider: Optional[str], api_key: Optional[str], status: int, headers: Optional[Mapping] = None) -> None:
+        """Tilpasser raten etter svaret: 429, brukt opp kvote eller suksess"""
+        bucket = self.bucket(provider, api_key)
+        if bucket is None:
+            return
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if status == 429:
+            bucket.rate_limited(_reset_in(headers))
+            return
+        remaining = _first(headers, _REMAINING_HEADERS)
+        if remaining is not None and _number(remaining) == 0:
+            reset_in = _reset_in(headers)
+            if reset_in:
+                bucket.exhausted(reset_in)
+        if status < 400:
+            bucket.succeeded()
+
+rate_limiter = RateLimiter()
+
+def retry_after(headers: Optional[Mapping]) -> Optional[float]:
+    """Sekunder til nytt forsøk, fra Retry-After eller rate-limit-headere i svaret"""
+    return _reset_in({k.lower(): v for k, v in (headers or {}).items()})
+
+def _first(headers: Dict[str, str], names: Tuple[str, ...]) -> Optional[str]:
+    for name in names:
+        if name in headers:
+            return headers[name]
+    return None
+
+def _number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _reset_in(headers: Dict[str, str]) -> Optional[float]:
+    """Sekunder til leverandøren tar imot nye kall, fra Retry-After eller rate-limit-headere"""
+    for name in _RESET_HEADERS:
+        value = headers.get(name)
+        if value is None:
+            continue
+        if name == "retry-after-ms":
+            number = _number(value)
+            return number / 1000 if number is not None else None
+        number = _number(value)
+        if number is not None:
+            # Noen leverandører oppgir tidspunkt (epoch) i stedet for sekunder
+            return max(0.0, number - time.time()) if number > 1e9 else number
+        duration = _duration(value)
+        if duration is not None:
+            return duration
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def _duration(value: str) -> Optional[float]:
+    """Tolker varigheter som '1s', '6m0s' og '20ms' (OpenAI)"""
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts or "".join(n + u for n, u in parts) != value.strip():
+        return None
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * units[u] for n, u in parts)
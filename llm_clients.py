@@ -0,0 +1,78 @@
+from typing import Dict, Iterable, Optional, Tuple
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+import asyncio
+import logging
+import os
+import threading
+import weakref
+import http_client
+
+# Register for LLM-klienter. Strukturerte runnables bygges én gang per
+# (modell, temperatur, skjema) og gjenbrukes på tvers av noder og kjøringer.
+# Alle deler HTTP-poolen i http_client: én sync-klient per prosess og én
+# async-klient per event loop (httpx-koblinger kan ikke deles mellom looper).
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))  # Sekunder per LLM-kall
+LLM_WARMUP = os.getenv("LLM_WARMUP", "false").lower() == "true"  # Åpne koblinger til OpenAI ved oppstart av API-et
+
+logger = logging.getLogger(__name__)
+
+ModelKey = Tuple[str, float, type]
+
+_sync_models: Dict[ModelKey, Runnable] = {}
+_async_models: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[ModelKey, Runnable]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def _chat_model(model: str, temperature: float, loop: Optional[asyncio.AbstractEventLoop]) -> ChatOpenAI:
+    clients = {"http_client": http_client.get_sync_client()}
+    if loop is not None:
+        clients["http_async_client"] = http_client.get_async_client()
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        api_key=os.getenv("OPENAI_API_KEY"),  # Bruk API-nøkkel direkte
+        timeout=LLM_TIMEOUT,  # Ellers arves lesetimeouten til den delte klienten
+        include_response_headers=True,  # Rate-limit-headere til rate_limiter
+        **clients
+    )
+
+def structured_model(schema: type, model: str, temperature: float) -> Runnable:
+    """Strukturert runnable (json_mode, include_raw) for skjemaet, bygget én gang.
+
+    Kalt fra async-kode gjelder klienten gjeldende event loop, ellers
+    prosessens sync-klient.
+    """
+    loop = _running_loop()
+    key = (model, temperature, schema)
+    with _lock:
+        models = _sync_models if loop is None else _async_models.setdefault(loop, {})
+        runnable = models.get(key)
+        if runnable is None:
+            runnable = _chat_model(model, temperature, loop).with_structured_output(
+                schema,
+                method="json_mode",
+                include_raw=True  # Rå-svaret trengs for token-metrikker
+            )
+            models[key] = runnable
+    return runnable
+
+async def warm_up(schemas: Iterable[type], model: str, temperature: float) -> None:
+    """Bygger runnables for event loopen og åpner en kobling til OpenAI på forhånd.
+
+    Feil logges og ignoreres; første ekte kall kobler da opp som vanlig.
+    """
+    for schema in schemas:
+        structured_model(schema, model, temperature)
+    if not os.getenv("OPENAI_API_KEY"):
+        return
+    try:
+        client = _chat_model(model, temperature, _running_loop()).root_async_client
+        await client.with_options(max_retries=0, timeout=10).models.list()
+    except Exception as e:
+        logger.warning("Oppvarming av OpenAI-kobling feilet: %s", e)
@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from typing import Callable, Optional
+import asyncio
+import functools
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Prometheus-metrikker for grafen, upstream-kall, LLM-bruk og cacher.
+# Eksponeres på /metrics i api.py. Alle metrikker er prosessglobale.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+NODE_DURATION = Histogram(
+    "prospect_node_duration_seconds",
+    "Kjøretid per node i grafen",
+    ["node", "status"],
+    buckets=LATENCY_BUCKETS
+)
+UPSTREAM_DURATION = Histogram(
+    "prospect_upstream_request_duration_seconds",
+    "Latens per HTTP-forsøk mot leverandør",
+    ["provider"],
+    buckets=LATENCY_BUCKETS
+)
+UPSTREAM_RESPONSES = Counter(
+    "prospect_upstream_responses_total",
+    "HTTP-svar fra leverandører per statuskode ('error' for brutte koblinger)",
+    ["provider", "status"]
+)
+UPSTREAM_RETRIES = Counter(
+    "prospect_upstream_retries_total",
+    "Nye forsøk mot leverandører",
+    ["provider", "reason"]
+)
+LLM_DURATION = Histogram(
+    "prospect_llm_request_duration_seconds",
+    "Latens per LLM-kall",
+    ["prompt", "status"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "prospect_llm_tokens_total",
+    "Tokens brukt per prompt",
+    ["prompt", "kind"]  # kind: input eller output
+)
+LLM_TOKENS_SAVED = Histogram(
+    "prospect_llm_prompt_tokens_saved",
+    "Estimerte tokens spart per prompt ved komprimering av input (også ved cache-treff)",
+    ["prompt"],
+    buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+)
+CACHE_REQUESTS = Counter(
+    "prospect_cache_requests_total",
+    "Cache-oppslag per cache og resultat (hit, stale_hit, negative_hit, miss)",
+    ["cache", "result"]
+)
+COALESCED_CALLS = Counter(
+    "prospect_coalesced_calls_total",
+    "Kall som ble slått sammen med et identisk pågående kall (singleflight)",
+    ["flight"]
+)
+
+def track_node(name: str, func: Callable) -> Callable:
+    """Pakker en node-funksjon (sync eller async) med kjøretidsmåling"""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with _timed(NODE_DURATION, node=name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _timed(NODE_DURATION, node=name):
+            return func(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def track_llm(prompt: str):
+    """Måler latens for ett LLM-kall"""
+    with _timed(LLM_DURATION, prompt=prompt):
+        yield
+
+def record_llm_usage(prompt: str, usage: Optional[dict]) -> None:
+    """Teller tokens fra usage_metadata på svaret fra modellen"""
+    if usage:
+        LLM_TOKENS.labels(prompt, "input").inc(usage.get("input_tokens", 0))
+        LLM_TOKENS.labels(prompt, "output").inc(usage.get("output_tokens", 0))
+
+def record_tokens_saved(prompt: str, tokens: int) -> None:
+    LLM_TOKENS_SAVED.labels(prompt).observe(tokens)
+
+def record_upstream(provider: Optional[str], status, duration: float) -> None:
+    provider = provider or "other"
+    UPSTREAM_DURATION.labels(provider).observe(duration)
+    UPSTREAM_RESPONSES.labels(provider, str(status)).inc()
+
+def record_retry(provider: Optional[str], reason) -> None:
+    UPSTREAM_RETRIES.labels(provider or "other", str(reason)).inc()
+
+def record_coalesced(flight: str) -> None:
+    COALESCED_CALLS.labels(flight).inc()
+
+def record_cache(cache: str, result: str) -> None:
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+def render() -> tuple:
+    """(innhold, content-type) for /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+@contextmanager
+def _timed(histogram: Histogram, **labels):
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        histogram.labels(status=status, **labels).observe(time.perf_counter() - started)
@@ -6,11 +6,8 @@ LINKEDIN_ANALYSIS_PROMPT = """Analyser denne LinkedIn profilen for rollen {role}
 Returner følgende felter i JSON format:
 {{
     "summary": "En kort profesjonell oppsummering basert på all tilgjengelig data",
-    "experience_years": 0,
-    "current_company_years": 0.0,
     "key_skills": [],
     "leadership_experience": false,
-    "education_level": "Velg én: Videregående, Bachelor, Master, PhD, eller Ukjent",
     "profile_type": "",
     "personality_traits": [
         {{"trait": "", "evidence": ""}}
@@ -25,11 +22,6 @@ Returner følgende felter i JSON format:
         "progression": "Pågående/Avsluttet",
         "relevance": "Høy/Medium/Lav"
     }},
-    "network_strength": {{
-        "followers": 0,
-        "connections": 0,
-        "engagement": "Høy/Medium/Lav"
-    }},
     "fun_facts": []
 }}
 
@@ -38,8 +30,7 @@ Profil data:
 
 NB: 
 - Skriv all analyse på norsk
-- Utdanningsnivå må være ett av følgende: Videregående, Bachelor, Master, PhD, eller Ukjent
-- Antall år i nåværende bedrift skal rundes til nærmeste halve år
+- Eldre erfaringer kan være utelatt (se omitted_experiences)
 """
 
 PRIORITY_ANALYSIS_PROMPT = """Analyser disse personene for å finne de som har rollen: {role}.
@@ -79,4 +70,42 @@ NB:
 - Begrunn tydelig hvorfor hver persons nåværende rolle er relevant
 - Skriv all begrunnelse på norsk
 - Tenk på at disse personene skal analyseres videre via LinkedIn i neste steg
-""" 
\ No newline at end of file
+""" 
+
+LINKEDIN_BATCH_ANALYSIS_PROMPT = """Analyser disse LinkedIn profilene for rollen {role}.
+
+Profilene er gitt som et JSON-objekt med email som nøkkel. Returner én analyse
+per profil i JSON format, med samme email som nøkkel:
+{{
+    "profiles": {{
+        "person@eksempel.no": {{
+            "summary": "En kort profesjonell oppsummering basert på all tilgjengelig data",
+            "key_skills": [],
+            "leadership_experience": false,
+            "profile_type": "",
+            "personality_traits": [
+                {{"trait": "", "evidence": ""}}
+            ],
+            "career_pattern": {{
+                "trajectory": "Oppadgående/Stabil/etc",
+                "changes": "Hyppige/Sjeldne jobbskifter",
+                "focus": "Hovedfokus i karrieren"
+            }},
+            "education_pattern": {{
+                "focus": "Teknisk/Forretning/etc",
+                "progression": "Pågående/Avsluttet",
+                "relevance": "Høy/Medium/Lav"
+            }},
+            "fun_facts": []
+        }}
+    }}
+}}
+
+Profiler å analysere:
+{profiles}
+
+NB: 
+- Returner nøyaktig én analyse for hver email i inputen, og analyser hver profil for seg
+- Skriv all analyse på norsk
+- Eldre erfaringer kan være utelatt (se omitted_experiences)
+"""
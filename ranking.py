@@ -0,0 +1,137 @@
+from typing import Dict, Iterable, List, Tuple
+from collections import Counter
+import math
+import re
+
+# Lokal, offline forhåndsrangering av Hunter-kontakter før LLM-prioriteringen.
+# Kombinerer TF-IDF-likhet mellom målrollen og kontaktens rolle/avdeling med
+# ansiennitet og Hunter confidence.
+
+SIMILARITY_WEIGHT = 0.6
+SENIORITY_WEIGHT = 0.25
+CONFIDENCE_WEIGHT = 0.15
+NO_LINKEDIN_PENALTY = 0.5  # Kontakter uten LinkedIn får uansett score 0 av LLM-en
+
+# Hunter sine seniority-verdier
+SENIORITY_SCORES = {
+    "executive": 1.0,
+    "senior": 0.7,
+    "junior": 0.3
+}
+DEFAULT_SENIORITY_SCORE = 0.5
+
+def tokenize(text: str) -> List[str]:
+    """Ord og tegn-trigrammer, slik at sammensatte ord som 'markedsføringssjef'
+    også matcher 'markedsføring'"""
+    features = []
+    for word in re.findall(r"\w+", (text or "").lower()):
+        features.append(word)
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+def _contact_text(user: Dict) -> str:
+    return f"{user.get('role') or ''} {user.get('department') or ''}"
+
+def _idf(document_frequency: Counter, total: int) -> Dict[str, float]:
+    return {t: math.log((1 + total) / (1 + df)) + 1 for t, df in document_frequency.items()}
+
+def _tfidf(counts: Counter, idf: Dict[str, float]) -> Dict[str, float]:
+    vector = {t: c * idf.get(t, 0.0) for t, c in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {t: v / norm for t, v in vector.items()} if norm else {}
+
+def _scored(user: Dict, counts: Counter, query_vector: Dict[str, float], idf: Dict[str, float]) -> Dict:
+    vector = _tfidf(counts, idf)
+    similarity = sum(w * vector.get(t, 0.0) for t, w in query_vector.items())
+    seniority = SENIORITY_SCORES.get((user.get("seniority") or "").lower(), DEFAULT_SENIORITY_SCORE)
+    try:
+        confidence = min(float(user.get("confidence") or 0) / 100, 1.0)
+    except ValueError:
+        confidence = 0.0
+
+    score = (
+        SIMILARITY_WEIGHT * similarity
+        + SENIORITY_WEIGHT * seniority
+        + CONFIDENCE_WEIGHT * confidence
+    )
+    if not user.get("linkedin_url"):
+        score *= NO_LINKEDIN_PENALTY
+
+    return {
+        **user,
+        "prerank_score": round(score, 4),
+        "prerank_similarity": round(similarity, 4)
+    }
+
+def _by_score(ranked: List[Dict]) -> None:
+    ranked.sort(key=lambda u: u["prerank_score"], reverse=True)
+
+class PrerankIndex:
+    """Forhåndsrangering for kontakter som kommer inn side for side.
+
+    Tokeniserte dokumenter og dokumentfrekvenser beholdes mellom sidene. Nye
+    kontakter scores med gjeldende IDF og flettes inn i rangeringen. Alle
+    scores regnes om bare når antall kontakter har doblet seg siden sist, så
+    samlet kostnad er O(n log n) i stedet for O(sider × n). finish() regner om
+    en siste gang, slik at rangeringen blir lik prerank_users() over alle.
+    """
+
+    def __init__(self, target_role: str):
+        self.query = Counter(tokenize(target_role))
+        self.document_frequency = Counter(self.query.keys())
+        self.documents: Dict[str, Tuple[Dict, Counter]] = {}  # email -> (kontakt, token-telling)
+        self.ranked: List[Dict] = []
+        self.scored = 0  # Antall kontakter ved siste fulle omregning
+
+    def add(self, users: Iterable[Dict]) -> List[Dict]:
+        new, replaced = [], False
+        for user in users:
+            counts = Counter(tokenize(_contact_text(user)))
+            previous = self.documents.get(user["email"])
+            if previous is not None:
+                self.document_frequency.subtract(previous[1].keys())
+                replaced = True
+            self.document_frequency.update(counts.keys())
+            self.documents[user["email"]] = (user, counts)
+            new.append((user, counts))
+        if replaced or len(self.documents) >= 2 * self.scored:
+            self._rescore()
+        elif new:
+            idf = _idf(self.document_frequency, len(self.documents) + 1)
+            query_vector = _tfidf(self.query, idf)
+            self.ranked.extend(_scored(user, counts, query_vector, idf) for user, counts in new)
+            _by_score(self.ranked)  # Timsort fletter den sorterte listen med de nye i lineær tid
+        return self.ranked
+
+    def finish(self) -> List[Dict]:
+        if self.scored != len(self.documents):
+            self._rescore()
+        return self.ranked
+
+    def _rescore(self) -> None:
+        # IDF over kontaktene i domenet pluss målrollen
+        idf = _idf(self.document_frequency, len(self.documents) + 1)
+        query_vector = _tfidf(self.query, idf)
+        self.ranked = [_scored(user, counts, query_vector, idf) for user, counts in self.documents.values()]
+        _by_score(self.ranked)
+        self.scored = len(self.documents)
+
+def prerank_users(users: List[Dict], target_role: str) -> List[Dict]:
+    """Scorer kontaktene lokalt og returnerer kopier med prerank-felter, best først.
+
+    Hver kopi får 'prerank_score' (0-1) og 'prerank_similarity'.
+    """
+    documents = [Counter(tokenize(_contact_text(u))) for u in users]
+    query = Counter(tokenize(target_role))
+
+    # IDF over kontaktene i domenet pluss målrollen
+    document_frequency = Counter()
+    for counts in documents + [query]:
+        document_frequency.update(counts.keys())
+    idf = _idf(document_frequency, len(documents) + 1)
+
+    query_vector = _tfidf(query, idf)
+    ranked = [_scored(user, counts, query_vector, idf) for user, counts in zip(users, documents)]
+    _by_score(ranked)
+    return ranked
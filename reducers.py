@@ -1,17 +1,103 @@
-from typing import List, Dict
-from langchain_core.messages import BaseMessage
-from models import UserBase
+from typing import Any, List, Dict, Iterable, Optional, Union
+from langchain_core.messages import BaseMessage, HumanMessage
+from events import event_log
+import os
+
+# Brukere i state lagres som en mapping email -> bruker
+UserMap = Dict[str, Dict]
+
+MESSAGE_LOG_MODE = os.getenv("MESSAGE_LOG_MODE", "full")  # full eller compact
+MESSAGE_LOG_MAX = int(os.getenv("MESSAGE_LOG_MAX", "50"))  # Meldinger som beholdes i compact-modus
+SUMMARY_KEY = "message_log_summary"
+RUN_KEY = "prospect_run"  # Kjøringen meldingen hører til (domene, rolle, thread_id)
 
 def add_messages(old_messages: List[BaseMessage], new_messages: List[BaseMessage]) -> List[BaseMessage]:
-    """Reducer for å kombinere meldinger"""
-    return old_messages + new_messages
-
-def add_users(old_users: List[Dict], new_users: List[Dict]) -> List[Dict]:
-    """Reducer for å oppdatere eller legge til brukere"""
-    email_to_user = {user['email']: UserBase(**user).model_dump() for user in old_users}
-    for new_user in new_users:
-        if new_user['email'] in email_to_user:
-            email_to_user[new_user['email']].update(UserBase(**new_user).model_dump())
-        else:
-            email_to_user[new_user['email']] = UserBase(**new_user).model_dump()
-    return list(email_to_user.values()) 
\ No newline at end of file
+    """Reducer for å kombinere meldinger.
+
+    I compact-modus beholdes bare de siste MESSAGE_LOG_MAX meldingene. Eldre
+    meldinger telles opp i én oppsummeringsmelding først i listen, og hver ny
+    melding legges i hendelsesloggen (events.event_log) med full detalj.
+    """
+    if MESSAGE_LOG_MODE != "compact":
+        return old_messages + new_messages
+
+    for message in new_messages:
+        _record(message)
+
+    summary = None
+    if old_messages and SUMMARY_KEY in old_messages[0].additional_kwargs:
+        summary, old_messages = old_messages[0], old_messages[1:]
+    combined = old_messages + new_messages
+
+    overflow = len(combined) - MESSAGE_LOG_MAX
+    if overflow <= 0:
+        return [summary] + combined if summary else combined
+    counters = _count(combined[:overflow], summary.additional_kwargs[SUMMARY_KEY] if summary else None)
+    return [_summary_message(counters)] + combined[overflow:]
+
+def tag_run(messages: Iterable[BaseMessage], run: Dict[str, Any]) -> None:
+    """Merker nye meldinger med kjøringen de hører til, slik at hendelsesloggen
+    kan skille samtidige kjøringer. Bare i compact-modus, der loggen fylles."""
+    if MESSAGE_LOG_MODE != "compact":
+        return
+    for message in messages:
+        message.additional_kwargs.setdefault(RUN_KEY, run)
+
+def _kind(message: BaseMessage) -> str:
+    return getattr(message, "tool_name", None) or message.type
+
+def _is_error(message: BaseMessage) -> bool:
+    return isinstance(message.content, str) and message.content.startswith("Feil")
+
+def _record(message: BaseMessage) -> None:
+    event_log.record(
+        _kind(message),
+        **message.additional_kwargs.get(RUN_KEY, {}),
+        id=getattr(message, "tool_call_id", None),
+        error=_is_error(message),
+        content=message.content
+    )
+
+def _count(dropped: List[BaseMessage], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Teller opp meldinger som faller ut av loggen, per type og antall feil"""
+    counters = {
+        "total": 0,
+        "errors": 0,
+        "by_kind": {},
+        **(previous or {})
+    }
+    by_kind = dict(counters["by_kind"])
+    for message in dropped:
+        kind = _kind(message)
+        by_kind[kind] = by_kind.get(kind, 0) + 1
+        counters["errors"] += _is_error(message)
+    counters["total"] += len(dropped)
+    counters["by_kind"] = by_kind
+    return counters
+
+def _summary_message(counters: Dict[str, Any]) -> HumanMessage:
+    return HumanMessage(
+        content=f"{counters['total']} eldre meldinger oppsummert ({counters['errors']} feil)",
+        additional_kwargs={SUMMARY_KEY: counters}
+    )
+
+def add_users(old_users: Union[UserMap, List[Dict]], new_users: Union[UserMap, Iterable[Dict]]) -> UserMap:
+    """Reducer for å oppdatere eller legge til brukere basert på email.
+
+    Bare de oppdaterte brukerne bearbeides. Eksisterende poster endres aldri på
+    stedet: mappingen kopieres grunt (checkpoints serialiseres i bakgrunnen fra
+    forrige verdi), og hver oppdatert bruker får en ny, kompakt post uten
+    None-felter. Valgfrie felter kan derfor mangle; les dem med .get().
+    """
+    if isinstance(old_users, list):  # Eldre checkpoints og tom input
+        old_users = {user["email"]: user for user in old_users}
+    updates = new_users.values() if isinstance(new_users, dict) else new_users
+
+    merged = None
+    for new_user in updates:
+        if merged is None:
+            merged = dict(old_users)
+        compact = {k: v for k, v in new_user.items() if v is not None}
+        current = merged.get(compact["email"])
+        merged[compact["email"]] = {**current, **compact} if current else compact
+    return old_users if merged is None else merged
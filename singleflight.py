@@ -0,0 +1,64 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import threading
+import weakref
+from metrics import record_coalesced
+
+# Singleflight: samtidige kall med samme nøkkel deler ett pågående kall i
+# stedet for å gjøre det samme arbeidet flere ganger. Brukes for identiske
+# /prospects-forespørsler og for LinkedIn-profiler og Hunter-sider.
+#
+# Sync-kall deles mellom tråder i prosessen, async-kall innenfor én event loop.
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Slår sammen samtidige kall med samme nøkkel (sync og async)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, asyncio.Task]]" = weakref.WeakKeyDictionary()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Kjører fn(), eller venter på et pågående kall med samme nøkkel og deler resultatet"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            record_coalesced(self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant av do(). Kallet kjører som egen task, så én avbrutt
+        venter stopper ikke de andre."""
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            tasks[key] = task
+            task.add_done_callback(lambda done: tasks.pop(key) if tasks.get(key) is done else None)
+        else:
+            record_coalesced(self.name)
+        return await asyncio.shield(task)
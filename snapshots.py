@@ -0,0 +1,73 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+import os
+from cache import SQLiteTTLCache
+
+# Øyeblikksbilde av forrige resultat per (domene, målrolle), med brukerne
+# nøklet på email. Brukes til inkrementell re-prospektering: nye kjøringer
+# sammenligner den ferske Hunter-listen med bildet og sender bare nye og
+# endrede kontakter gjennom prioritering og LinkedIn-analyse.
+INCREMENTAL_PROSPECTING = os.getenv("INCREMENTAL_PROSPECTING", "false").lower() == "true"  # Gjenbruk forrige kjøring for samme domene og rolle
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", str(30 * 24 * 3600)))  # Sekunder et øyeblikksbilde kan gjenbrukes
+
+# En kontakt regnes som endret når ett av disse feltene er ulikt. LinkedIn-URL
+# er med fordi berikelsen hører til profilen, ikke til e-postadressen.
+DIFF_FIELDS = ("role", "department", "seniority", "linkedin_url")
+
+snapshot_store = SQLiteTTLCache(
+    namespace="prospect_snapshots",
+    ttl=SNAPSHOT_TTL,
+    max_entries=int(os.getenv("SNAPSHOT_MAX_ENTRIES", "1000"))
+)
+
+class ContactDiff(NamedTuple):
+    new: List[str]
+    changed: List[str]
+    unchanged: List[str]
+    removed: List[str]
+
+    @property
+    def delta(self) -> set:
+        """Kontakter som må analyseres på nytt"""
+        return set(self.new) | set(self.changed)
+
+    def describe(self) -> str:
+        return (
+            f"{len(self.new)} nye, {len(self.changed)} endrede, "
+            f"{len(self.unchanged)} uendrede og {len(self.removed)} borte siden forrige kjøring"
+        )
+
+def snapshot_key(domain: str, target_role: str) -> str:
+    return f"{domain.strip().lower()}|{' '.join(target_role.lower().split())}"
+
+def load_snapshot(domain: str, target_role: str) -> Optional[Dict[str, Any]]:
+    """Forrige resultat: {"max_results": ..., "users": {email: bruker}}, eller None"""
+    entry = snapshot_store.get(snapshot_key(domain, target_role))
+    return entry.value if entry else None
+
+def save_snapshot(domain: str, target_role: str, max_results: Optional[int], users: Iterable[Dict]) -> int:
+    """Lagrer resultatet for neste kjøring. Returnerer antall kontakter i bildet."""
+    snapshot_users = {user["email"].lower(): user for user in users if user.get("email")}
+    snapshot_store.set(snapshot_key(domain, target_role), {"max_results": max_results, "users": snapshot_users})
+    return len(snapshot_users)
+
+def previous_user(snapshot: Dict[str, Any], email: str) -> Optional[Dict]:
+    return snapshot["users"].get(email.lower())
+
+def is_changed(previous: Dict, current: Dict) -> bool:
+    return any((previous.get(f) or "") != (current.get(f) or "") for f in DIFF_FIELDS)
+
+def diff_contacts(snapshot: Dict[str, Any], users: Iterable[Dict]) -> ContactDiff:
+    """Sammenligner den ferske kontaktlisten med øyeblikksbildet"""
+    new, changed, unchanged, seen = [], [], [], set()
+    for user in users:
+        email = user["email"]
+        seen.add(email.lower())
+        previous = previous_user(snapshot, email)
+        if previous is None:
+            new.append(email)
+        elif is_changed(previous, user):
+            changed.append(email)
+        else:
+            unchanged.append(email)
+    removed = [email for email in snapshot["users"] if email not in seen]
+    return ContactDiff(new, changed, unchanged, removed)
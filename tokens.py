@@ -0,0 +1,9 @@
+import math
+
+# Grovt, deterministisk estimat uten nettverk eller tokenizer-filer.
+# JSON og norsk tekst ligger typisk på 3-4 tegn per token, vi regner konservativt.
+CHARS_PER_TOKEN = 3.5
+
+def estimate_tokens(text: str) -> int:
+    """Estimerer antall tokens i en tekst"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
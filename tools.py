@@ -1,8 +1,14 @@
 from typing import Dict, Optional, List
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
+import asyncio
+import httpx
 import requests
 import os
+import re
+import http_client
+from cache import SQLiteTTLCache, StaleWhileRevalidateCache
+from singleflight import SingleFlight
 
 class LinkedInProfileResponse(BaseModel):
     """Strukturert respons fra LinkedIn API"""
@@ -21,46 +27,176 @@ class LinkedInProfileResponse(BaseModel):
 class LinkedInInput(BaseModel):
     linkedin_url: str = Field(..., description="LinkedIn profil URL")
 
+RAPIDAPI_BASE_URL = os.getenv("RAPIDAPI_BASE_URL", "https://fresh-linkedin-profile-data.p.rapidapi.com")  # Kan pekes mot lokal stub
+LINKEDIN_API_URL = f"{RAPIDAPI_BASE_URL}/get-linkedin-profile"
+
+# Persistent cache for LinkedIn-profiler, nøkkel er normalisert URL
+LINKEDIN_CACHE_ENABLED = os.getenv("LINKEDIN_CACHE_ENABLED", "true").lower() == "true"
+linkedin_cache = SQLiteTTLCache(
+    namespace="linkedin_profile",
+    ttl=float(os.getenv("LINKEDIN_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("LINKEDIN_CACHE_MAX_ENTRIES", "10000")),
+    negative_ttl=float(os.getenv("LINKEDIN_CACHE_NEGATIVE_TTL", str(24 * 3600)))
+)
+
+# Kortlevd minnecache for profiler som hentes spekulativt mens prioriteringen
+# pågår. Profiler som ikke blir valgt ligger her til de utløper.
+LINKEDIN_PREFETCH_TTL = float(os.getenv("LINKEDIN_PREFETCH_TTL", "900"))  # Sekunder en forhåndshentet profil holdes i minnet
+prefetch_cache = StaleWhileRevalidateCache(
+    ttl=LINKEDIN_PREFETCH_TTL,
+    stale_ttl=LINKEDIN_PREFETCH_TTL,
+    max_entries=int(os.getenv("LINKEDIN_PREFETCH_MAX_ENTRIES", "500")),
+    name="linkedin_prefetch"
+)
+
+def normalize_linkedin_url(linkedin_url: str) -> str:
+    """Normaliserer LinkedIn URL til formen 'linkedin.com/in/<slug>'"""
+    url = linkedin_url.strip().lower()
+    url = re.sub(r"^[a-z]+://", "", url)
+    url = re.split(r"[?#]", url, maxsplit=1)[0]
+    url = re.sub(r"^([a-z]{2,3}\.|www\.)?linkedin\.com", "linkedin.com", url)
+    return url.rstrip("/")
+
+def _cached_profile(cache_key: str) -> Optional[Dict]:
+    """Slår opp profilen i cachen. Kaster feil ved negativt treff (404)."""
+    if not LINKEDIN_CACHE_ENABLED:
+        return None
+    entry = linkedin_cache.get(cache_key)
+    if entry is None:
+        return None
+    if entry.negative:
+        raise Exception("LinkedIn API error: 404 Not Found (cached)")
+    return entry.value
+
+async def _acached_profile(cache_key: str) -> Optional[Dict]:
+    """Async variant av _cached_profile()"""
+    if not LINKEDIN_CACHE_ENABLED:
+        return None
+    return await asyncio.to_thread(_cached_profile, cache_key)
+
+def _prefetched_profile(cache_key: str) -> Optional[Dict]:
+    """Profil hentet spekulativt. Tom cache betyr at prefetch ikke er i bruk, og
+    da slås den ikke opp (og teller ikke som miss i cache-metrikkene)."""
+    if not prefetch_cache:
+        return None
+    return prefetch_cache.get(cache_key)[0]
+
+def _linkedin_request(linkedin_url: str) -> Dict:
+    """Felles parametere for LinkedIn-kallet"""
+    return {
+        "params": {
+            "linkedin_url": linkedin_url,
+            "include_skills": "false",
+            "include_certifications": "false",
+            "include_publications": "false",
+            "include_honors": "false",
+            "include_volunteers": "false",
+            "include_projects": "false",
+            "include_patents": "false",
+            "include_courses": "false",
+            "include_organizations": "false",
+            "include_profile_status": "false",
+            "include_company_public_url": "false"
+        },
+        "headers": {
+            'X-RapidAPI-Key': os.getenv('RAPIDAPI_KEY'),
+            'X-RapidAPI-Host': 'fresh-linkedin-profile-data.p.rapidapi.com'
+        }
+    }
+
+# Samtidige oppslag av samme profil deler ett kall mot RapidAPI
+linkedin_flight = SingleFlight("linkedin_profile")
+
 def get_linkedin_profile(linkedin_url: str) -> Dict:
     """Henter LinkedIn profil data via RapidAPI."""
-    headers = {
-        'X-RapidAPI-Key': os.getenv('RAPIDAPI_KEY'),
-        'X-RapidAPI-Host': 'fresh-linkedin-profile-data.p.rapidapi.com'
-    }
+    cache_key = normalize_linkedin_url(linkedin_url)
+    cached = _cached_profile(cache_key)
+    if cached is not None:
+        return cached
+    prefetched = _prefetched_profile(cache_key)
+    if prefetched is not None:
+        return prefetched
+    return linkedin_flight.do(cache_key, lambda: _fetch_linkedin_profile(linkedin_url, cache_key))
+
+def prefetch_linkedin_profile(linkedin_url: str) -> None:
+    """Henter profilen spekulativt inn i prefetch_cache.
     
+    Et oppslag som kommer mens hentingen pågår, deler kallet (singleflight).
+    Feil ignoreres; det ekte oppslaget prøver igjen og rapporterer feilen.
+    """
+    cache_key = normalize_linkedin_url(linkedin_url)
     try:
-        response = requests.get(
-            "https://fresh-linkedin-profile-data.p.rapidapi.com/get-linkedin-profile",
-            params={
-                "linkedin_url": linkedin_url,
-                "include_skills": "false",
-                "include_certifications": "false",
-                "include_publications": "false",
-                "include_honors": "false",
-                "include_volunteers": "false",
-                "include_projects": "false",
-                "include_patents": "false",
-                "include_courses": "false",
-                "include_organizations": "false",
-                "include_profile_status": "false",
-                "include_company_public_url": "false"
-            },
-            headers=headers
-        )
+        if _cached_profile(cache_key) is not None:
+            return
+        profile = linkedin_flight.do(cache_key, lambda: _fetch_linkedin_profile(linkedin_url, cache_key))
+    except Exception:
+        return
+    prefetch_cache.set(cache_key, profile)
+
+def _fetch_linkedin_profile(linkedin_url: str, cache_key: str) -> Dict:
+    try:
+        response = http_client.get(LINKEDIN_API_URL, provider="rapidapi", rate_key=os.getenv('RAPIDAPI_KEY'), **_linkedin_request(linkedin_url))
+        if response.status_code == 404 and LINKEDIN_CACHE_ENABLED:
+            linkedin_cache.set_negative(cache_key)
         response.raise_for_status()
         data = response.json()["data"]
         
         # Valider og strukturer responsen
-        return LinkedInProfileResponse(**data).dict()
+        profile = LinkedInProfileResponse(**data).dict()
         
     except requests.RequestException as e:
         raise Exception(f"LinkedIn API error: {str(e)}")
+    
+    if LINKEDIN_CACHE_ENABLED:
+        linkedin_cache.set(cache_key, profile)
+    return profile
+
+async def aget_linkedin_profile(linkedin_url: str) -> Dict:
+    """Async variant av get_linkedin_profile. Cachen er SQLite og slås opp i en
+    tråd, slik at event loopen ikke venter på disken."""
+    cache_key = normalize_linkedin_url(linkedin_url)
+    cached = await _acached_profile(cache_key)
+    if cached is not None:
+        return cached
+    prefetched = _prefetched_profile(cache_key)
+    if prefetched is not None:
+        return prefetched
+    return await linkedin_flight.ado(cache_key, lambda: _afetch_linkedin_profile(linkedin_url, cache_key))
+
+async def aprefetch_linkedin_profile(linkedin_url: str) -> None:
+    """Async variant av prefetch_linkedin_profile()"""
+    cache_key = normalize_linkedin_url(linkedin_url)
+    try:
+        if await _acached_profile(cache_key) is not None:
+            return
+        profile = await linkedin_flight.ado(cache_key, lambda: _afetch_linkedin_profile(linkedin_url, cache_key))
+    except Exception:
+        return
+    prefetch_cache.set(cache_key, profile)
+
+async def _afetch_linkedin_profile(linkedin_url: str, cache_key: str) -> Dict:
+    try:
+        response = await http_client.aget(LINKEDIN_API_URL, provider="rapidapi", rate_key=os.getenv('RAPIDAPI_KEY'), **_linkedin_request(linkedin_url))
+        if response.status_code == 404 and LINKEDIN_CACHE_ENABLED:
+            await asyncio.to_thread(linkedin_cache.set_negative, cache_key)
+        response.raise_for_status()
+        data = response.json()["data"]
+        
+        profile = LinkedInProfileResponse(**data).dict()
+        
+    except httpx.HTTPError as e:
+        raise Exception(f"LinkedIn API error: {str(e)}")
+    
+    if LINKEDIN_CACHE_ENABLED:
+        await asyncio.to_thread(linkedin_cache.set, cache_key, profile)
+    return profile
 
 # Definer LinkedIn tool
 linkedin_tool = StructuredTool(
     name="get_linkedin_profile",
     description="Henter og validerer LinkedIn profil data",
     func=get_linkedin_profile,
+    coroutine=aget_linkedin_profile,
     args_schema=LinkedInInput,
     return_type=LinkedInProfileResponse
 )
@@ -76,11 +212,39 @@ class HunterInput(BaseModel):
     offset: int = Field(default=0, description="Offset for paginering")
     limit: int = Field(default=50, description="Antall resultater per side")
 
+HUNTER_BASE_URL = os.getenv("HUNTER_BASE_URL", "https://api.hunter.io")  # Kan pekes mot lokal stub
+HUNTER_API_URL = f"{HUNTER_BASE_URL}/v2/domain-search"
+
+def _hunter_response(data: Dict, offset: int, limit: int) -> Dict:
+    """Valider og strukturer responsen"""
+    return HunterResponse(
+        emails=data["data"]["emails"],
+        meta={
+            "total": data["meta"]["results"],
+            "offset": offset,
+            "limit": limit
+        }
+    ).dict()
+
+# Samtidige kjøringer som trenger samme Hunter-side deler ett kall
+hunter_flight = SingleFlight("hunter_page")
+
+def _hunter_page_key(domain: str, api_key: str, offset: int, limit: int) -> tuple:
+    return (domain.strip().lower(), api_key, offset, limit)
+
 def get_hunter_data(domain: str, api_key: str, offset: int = 0, limit: int = 50) -> Dict:
     """Henter brukerdata fra Hunter.io API med paginering."""
+    return hunter_flight.do(
+        _hunter_page_key(domain, api_key, offset, limit),
+        lambda: _fetch_hunter_data(domain, api_key, offset, limit)
+    )
+
+def _fetch_hunter_data(domain: str, api_key: str, offset: int, limit: int) -> Dict:
     try:
-        response = requests.get(
-            "https://api.hunter.io/v2/domain-search",
+        response = http_client.get(
+            HUNTER_API_URL,
+            provider="hunter",
+            rate_key=api_key,
             params={
                 "domain": domain,
                 "api_key": api_key,
@@ -89,19 +253,35 @@ def get_hunter_data(domain: str, api_key: str, offset: int = 0, limit: int = 50)
             }
         )
         response.raise_for_status()
-        data = response.json()
+        return _hunter_response(response.json(), offset, limit)
         
-        # Valider og strukturer responsen
-        return HunterResponse(
-            emails=data["data"]["emails"],
-            meta={
-                "total": data["meta"]["results"],
+    except requests.RequestException as e:
+        raise Exception(f"Hunter API error: {str(e)}")
+
+async def aget_hunter_data(domain: str, api_key: str, offset: int = 0, limit: int = 50) -> Dict:
+    """Async variant av get_hunter_data."""
+    return await hunter_flight.ado(
+        _hunter_page_key(domain, api_key, offset, limit),
+        lambda: _afetch_hunter_data(domain, api_key, offset, limit)
+    )
+
+async def _afetch_hunter_data(domain: str, api_key: str, offset: int, limit: int) -> Dict:
+    try:
+        response = await http_client.aget(
+            HUNTER_API_URL,
+            provider="hunter",
+            rate_key=api_key,
+            params={
+                "domain": domain,
+                "api_key": api_key,
                 "offset": offset,
                 "limit": limit
             }
-        ).dict()
+        )
+        response.raise_for_status()
+        return _hunter_response(response.json(), offset, limit)
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise Exception(f"Hunter API error: {str(e)}")
 
 # Oppdater Hunter tool med ny input/output
@@ -109,6 +289,7 @@ hunter_tool = StructuredTool(
     name="get_hunter_data",
     description="Henter brukerdata fra Hunter.io med paginering",
     func=get_hunter_data,
+    coroutine=aget_hunter_data,
     args_schema=HunterInput,
     return_type=HunterResponse
 ) 
\ No newline at end of file